@@ -0,0 +1,134 @@
+import io
+import struct
+import threading
+import time
+import numpy as np
+from pydub import AudioSegment
+
+TARGET_SAMPLE_RATE = 16000  # Mono 16 kHz 16-bit PCM is what speech engines want
+
+class PcmAudio:
+    """Mono 16-bit PCM samples held as a NumPy array, often a view over the original upload."""
+
+    __slots__ = ("samples", "sample_rate")
+
+    def __init__(self, samples, sample_rate=TARGET_SAMPLE_RATE):
+        self.samples = samples
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def frames(self):
+        """Returns the raw little-endian frames as a memoryview, without copying when possible."""
+        return memoryview(np.ascontiguousarray(self.samples, dtype="<i2")).cast("B")
+
+class DecodeStats:
+    """Per-format decode counters, to show which client formats are expensive to accept."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._formats = {}
+
+    def record(self, file_format, seconds, input_bytes, audio_seconds, passthrough):
+        with self._lock:
+            entry = self._formats.setdefault(file_format, {
+                "count": 0, "seconds": 0.0, "input_bytes": 0, "audio_seconds": 0.0, "passthrough": 0,
+            })
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["input_bytes"] += input_bytes
+            entry["audio_seconds"] += audio_seconds
+            entry["passthrough"] += int(passthrough)
+
+    def stats(self):
+        with self._lock:
+            return {
+                file_format: {
+                    **entry,
+                    "mean_decode_ms": 1000.0 * entry["seconds"] / entry["count"],
+                    # Seconds spent decoding per second of audio; lower is cheaper.
+                    "realtime_factor": entry["seconds"] / entry["audio_seconds"] if entry["audio_seconds"] else None,
+                }
+                for file_format, entry in self._formats.items()
+            }
+
+decode_stats = DecodeStats()
+
+def _parse_wav(data):
+    """
+    Returns (channels, sample_rate, bits_per_sample, data_offset, data_size) for
+    uncompressed PCM WAV, or None if the file needs a full decoder.
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate = struct.unpack_from("<HHI", data, body)
+            bits_per_sample = struct.unpack_from("<H", data, body + 14)[0]
+            if audio_format != 1:
+                return None
+            fmt = (channels, sample_rate, bits_per_sample)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            return fmt + (body, min(chunk_size, len(data) - body))
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+def _to_target(samples, channels, sample_rate):
+    """Downmixes to mono and resamples to TARGET_SAMPLE_RATE; a no-op view when already in shape."""
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if sample_rate != TARGET_SAMPLE_RATE and len(samples):
+        target_length = int(round(len(samples) * TARGET_SAMPLE_RATE / sample_rate))
+        positions = np.linspace(0, len(samples) - 1, target_length)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+    return samples
+
+def decode_to_pcm(data, file_format):
+    """
+    Decodes audio bytes to mono 16 kHz PCM. Raw PCM ("pcm", assumed 16 kHz
+    mono s16le) and 16-bit PCM WAV are read in place without ffmpeg; every
+    other format goes through pydub once, straight to raw samples.
+    """
+    started = time.perf_counter()
+    passthrough = False
+    if file_format == "pcm":
+        samples = np.frombuffer(data, dtype="<i2", count=len(data) // 2)
+        passthrough = True
+    else:
+        wav_header = _parse_wav(data) if file_format == "wav" else None
+        if wav_header is not None and wav_header[2] == 16:
+            channels, sample_rate, _, data_offset, data_size = wav_header
+            samples = np.frombuffer(data, dtype="<i2", count=data_size // 2, offset=data_offset)
+            samples = _to_target(samples, channels, sample_rate)
+            passthrough = True
+        else:
+            audio = AudioSegment.from_file(io.BytesIO(data), format=file_format)
+            audio = audio.set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE).set_sample_width(2)
+            samples = np.frombuffer(audio.raw_data, dtype="<i2")
+    pcm = PcmAudio(samples)
+    decode_stats.record(file_format, time.perf_counter() - started, len(data), pcm.duration, passthrough)
+    return pcm
+
+def pcm_from_array(samples, sample_rate):
+    """Converts an in-memory (samples[, channels]) array, e.g. from a microphone, to mono 16 kHz PCM."""
+    samples = np.asarray(samples)
+    if samples.dtype.kind == "f":
+        samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    elif samples.dtype != np.int16:
+        # Rescale other integer PCM (e.g. int32 or uint8 frames) to 16 bits; a plain cast wraps wide samples into noise.
+        bits = samples.dtype.itemsize * 8
+        wide = samples.astype(np.int64)
+        if samples.dtype.kind == "u":
+            wide -= 1 << (bits - 1)  # Unsigned PCM is centred on the middle of its range
+        samples = (wide >> (bits - 16) if bits > 16 else wide << (16 - bits)).astype(np.int16)
+    channels = samples.shape[1] if samples.ndim == 2 else 1
+    return PcmAudio(_to_target(samples.reshape(-1), channels, sample_rate))
@@ -7,143 +7,396 @@ import base64
 import filetype  
 import torch
 import uvicorn
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi import Body
 from pydantic import BaseModel
-from transformers import DistilBertForSequenceClassification, DistilBertTokenizer
+from typing import Optional
 from datetime import datetime
-from predict import convert_audio_to_wav, transcribe_audio, predict_scam, get_status_details
+from predict import predict_scam_ids_batch, split_windows, pool_window_scores, encode_text, get_status_details
+from batcher import InferenceBatcher
+from stages import Stage, StageOverloaded
+from call_store import create_call_store
+from prediction_cache import PredictionCache
+from lexical_filter import LexicalScorer, ScoringCascade, LEXICAL_MODEL_PATH
+from persistence import ConnectionPool, CallRecordWriter
+from schema import init_db, backfill_fts, fts_query, search_calls
+from model_registry import load_classifier, warm_up
+from inference_backends import SERVING_BACKENDS
+from transcription import get_engine, NoSpeechError
+from audio_decode import decode_to_pcm, decode_stats
+from metrics import metrics, request_profile
+from vad import VoiceActivityDetector
+from caller_reputation import CallerReputationIndex
 import mimetypes
+import json
 import random
+import asyncio
+import queue
 
 # --- Configuration ---
 MODEL_NAME = "distilbert-base-uncased"
 CACHE_DIR = "./hf_models"
 MODEL_DIR = "model/scam_detector"
 DATABASE_PATH = "scam_calls.db"
+DB_POOL_SIZE = 4  # Long-lived read connections shared by request handlers
+DB_SYNCHRONOUS = "NORMAL"  # SQLite synchronous level for writes: OFF, NORMAL or FULL
+WRITE_BATCH_SIZE = 200  # Max call_records rows group-committed in one transaction
+WRITE_FLUSH_INTERVAL = 0.05  # Seconds the writer waits to fill a batch
+SAVE_CALL_WAIT_FOR_COMMIT = False  # True makes save_call wait until its row is committed
+PREDICTION_CACHE_SIZE = 10000  # Max cached context scores
+PREDICTION_CACHE_TTL = 3600  # Seconds before a cached score is recomputed
+FINAL_STATUS_POOLING = "max"  # How window scores of a long transcript combine: max, mean or attention
+WINDOW_OVERLAP = 128  # Tokens shared by consecutive windows when scoring a full transcript
+LEXICAL_CASCADE_LOW = 0.1  # Lexical scores below this are answered as safe without DistilBERT
+LEXICAL_CASCADE_HIGH = 0.95  # Lexical scores above this are answered as scam without DistilBERT
+LEXICAL_SHADOW_RATE = 0.02  # Fraction of lexical answers re-scored by DistilBERT to measure agreement
 MAX_CONTEXT_TOKENS = 512
 CONTEXT_TRUNCATION = 100
 ABANDONED_CALL_TIMEOUT = 30
+EVICTION_INTERVAL = 5  # Seconds between background sweeps for abandoned calls
+FTS_BACKFILL_INTERVAL = 1.0  # Seconds between backfill batches for records that predate the search index
+MAX_SEARCH_PAGE_SIZE = 100
+REPUTATION_REFRESH_INTERVAL = 2.0  # Seconds between reads of newly saved calls into the caller reputation index
+REPUTATION_REBUILD_INTERVAL = 3600.0  # Seconds between full recounts, which un-flag numbers whose reports were corrected
+MAX_ACTIVE_CALLS = 10000  # Least recently active calls are evicted beyond this
+MAX_CONTEXT_MEMORY_BYTES = 256 * 1024 * 1024  # Cap on buffered context ids and chunk text
 DATASET_VERSION = "1.0"
 ALLOWED_AUDIO_FORMATS = ["mp3", "wav", "3gp", "mpeg", "m4a", "ogg", "flac"]
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "fp32")  # fp32 or int8
+TRANSCRIPTION_ENGINE = os.environ.get("TRANSCRIPTION_ENGINE", "google")  # google, sphinx or stub
+TRANSCRIPTION_TIMEOUT = 10.0
+VAD_ENABLED = True  # Skip silent and non-speech chunks before transcription
+# Comma-separated host:port list of call_store.py servers; empty keeps call state in this process
+CALL_STORE_ADDRESSES = [address for address in os.environ.get("CALL_STORE_ADDRESSES", "").split(",") if address]
+CALL_STORE_AUTHKEY = os.environ.get("CALL_STORE_AUTHKEY", "").encode()  # Required with CALL_STORE_ADDRESSES
+MAX_BATCH_SIZE = 16  # Max contexts scored in one forward pass
+MAX_BATCH_WAIT_MS = 5  # How long the batcher waits for more contexts to arrive
+DECODE_WORKERS = 4  # Threads for base64 decode and ffmpeg conversion
+DECODE_MAX_PENDING = 64
+TRANSCRIPTION_WORKERS = 16  # Threads for blocking speech-to-text requests
+TRANSCRIPTION_MAX_PENDING = 128
+INFERENCE_WORKERS = 1  # Torch already parallelises a forward pass across cores
+INFERENCE_MAX_PENDING = 256
+PROFILE_HEADER = "X-Profile"  # Requests sending this header get per-stage timings back in Server-Timing
 
 class ScamDetectionRequest(BaseModel):
     call_id: str
     base64: str
+    caller_number: Optional[str] = None
 
 # --- Database Setup ---
 def get_db():
-    db = sqlite3.connect(DATABASE_PATH)
-    db.row_factory = sqlite3.Row  # Access columns by name
-    try:
+    with db_pool.connection() as db:
         yield db
-    finally:
-        db.close()
 
-def init_db():
-    with sqlite3.connect(DATABASE_PATH) as db:
-        cursor = db.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS call_records (
-                call_id TEXT PRIMARY KEY,
-                start_time DATETIME,
-                end_time DATETIME,
-                duration REAL,
-                caller_number TEXT,
-                full_transcription TEXT,
-                user_feedback TEXT,
-                final_status TEXT,
-                model_version_used TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS model_metadata (
-                model_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                model_name TEXT,
-                training_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                dataset_version TEXT,
-                accuracy REAL,
-                training_epochs INTEGER,
-                number_labels INTEGER
-            )
-        """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_call_id ON call_records (call_id)")
-        db.commit()
-
-init_db()
+init_db(DATABASE_PATH, DB_SYNCHRONOUS)
+db_pool = ConnectionPool(DATABASE_PATH, DB_POOL_SIZE, DB_SYNCHRONOUS)
+call_writer = CallRecordWriter(DATABASE_PATH, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, DB_SYNCHRONOUS)
 
 # --- Model Loading ---
 def load_model():
-    tokenizer = DistilBertTokenizer.from_pretrained(MODEL_NAME, cache_dir=CACHE_DIR)
-    try:
-        model = DistilBertForSequenceClassification.from_pretrained(MODEL_DIR)
-        print("Loaded fine-tuned model from:", MODEL_DIR)
-        model_version_name = MODEL_DIR
-    except Exception as e:
-        print(f"Could not load fine-tuned model: {e}. Loading pre-trained model.")
-        model = DistilBertForSequenceClassification.from_pretrained(MODEL_NAME, num_labels=2, cache_dir=CACHE_DIR)
-        model_version_name = MODEL_NAME
-    model.to(device)
-    model.eval()
-    return tokenizer, model, model_version_name
+    if INFERENCE_BACKEND not in SERVING_BACKENDS:
+        raise ValueError(f"INFERENCE_BACKEND must be one of: {', '.join(SERVING_BACKENDS)}")
+    return load_classifier(device, MODEL_DIR, INFERENCE_BACKEND)
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+model_load_started = time.perf_counter()
 tokenizer, model, model_version = load_model() 
+model_load_seconds = time.perf_counter() - model_load_started
+
+# --- Execution Stages ---
+decode_stage = Stage("decode", DECODE_WORKERS, DECODE_MAX_PENDING)
+transcription_stage = Stage("transcription", TRANSCRIPTION_WORKERS, TRANSCRIPTION_MAX_PENDING)
+inference_stage = Stage("inference", INFERENCE_WORKERS, INFERENCE_MAX_PENDING)
+transcription_engine = get_engine(TRANSCRIPTION_ENGINE, TRANSCRIPTION_TIMEOUT)
+vad = VoiceActivityDetector() if VAD_ENABLED else None
+batcher = InferenceBatcher(
+    lambda contexts: predict_scam_ids_batch(contexts, model, device),
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_BATCH_WAIT_MS,
+    executor=inference_stage.executor,
+)
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+def load_cascade():
+    """Returns the lexical pre-filter if one has been trained (python lexical_filter.py), else None."""
+    if not os.path.exists(LEXICAL_MODEL_PATH):
+        print(f"No lexical filter at {LEXICAL_MODEL_PATH}; every context goes to DistilBERT.")
+        return None
+    return ScoringCascade(
+        LexicalScorer.load(LEXICAL_MODEL_PATH), LEXICAL_CASCADE_LOW, LEXICAL_CASCADE_HIGH, LEXICAL_SHADOW_RATE
+    )
+
+cascade = load_cascade()
+shadow_tasks = set()
 
 # --- In-Memory Call Context Storage ---
-active_calls = {}  # {call_id: {context: "", chunk_count: 0, start_time: 0.0, last_chunk_time: 0.0}}
-
-def update_context(call_id: str, new_text: str, tokenizer) -> str:
-    """Updates the conversation context for a given call_id."""
-    if call_id not in active_calls:
-        active_calls[call_id] = {
-            "context": "",
-            "chunk_count": 0,
-            "start_time": time.time(),
-            "last_chunk_time": time.time(),
-            "chunks": []
-        }
-
-    full_context = active_calls[call_id]["context"] + " " + new_text
-    tokens = tokenizer.tokenize(full_context)
-    if len(tokens) > MAX_CONTEXT_TOKENS:
-        truncated_tokens = tokens[len(tokens) - MAX_CONTEXT_TOKENS + CONTEXT_TRUNCATION:]
-        full_context = tokenizer.convert_tokens_to_string(truncated_tokens)
-    active_calls[call_id]["context"] = full_context
-    active_calls[call_id]["chunk_count"] += 1
-    active_calls[call_id]["last_chunk_time"] = time.time()
-    active_calls[call_id]["chunks"].append(new_text)
-    return full_context
+# {call_id: {context_ids: TokenRingBuffer, chunk_count: 0, start_time: 0.0, last_chunk_time: 0.0, chunks: [], last_score: None}}
+active_calls = create_call_store(
+    CALL_STORE_ADDRESSES, CALL_STORE_AUTHKEY, MAX_CONTEXT_TOKENS, MAX_CONTEXT_TOKENS - CONTEXT_TRUNCATION,
+    max_calls=MAX_ACTIVE_CALLS, max_context_bytes=MAX_CONTEXT_MEMORY_BYTES,
+)
+eviction_task = None
+backfill_task = None
+reputation = CallerReputationIndex()
+reputation_task = None
+
+async def run_store_op(fn, *args):
+    """
+    Calls a call-store method. With CALL_STORE_ADDRESSES set every call is a
+    blocking proxy round trip, so it runs in a thread instead of on the loop.
+    """
+    if CALL_STORE_ADDRESSES:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def evict_abandoned_calls():
+    """Drops calls that stopped sending chunks, without waiting for /abandoned-calls/."""
+    while True:
+        await asyncio.sleep(EVICTION_INTERVAL)
+        try:
+            await run_store_op(active_calls.remove_expired, ABANDONED_CALL_TIMEOUT)
+        except Exception as e:
+            print(f"Error evicting abandoned calls: {e}")
+
+async def backfill_search_index():
+    """Indexes pre-existing call records for /search-calls/ a batch at a time, off the event loop."""
+    while True:
+        try:
+            remaining = await asyncio.to_thread(backfill_fts, DATABASE_PATH, synchronous=DB_SYNCHRONOUS)
+        except sqlite3.Error as e:
+            print(f"Error backfilling search index: {e}")
+            remaining = 1
+        if not remaining:
+            break
+        await asyncio.sleep(FTS_BACKFILL_INTERVAL)
+
+async def refresh_reputation():
+    """
+    Folds newly saved calls (from any worker) into the caller reputation
+    index, and rebuilds it from the whole table every REPUTATION_REBUILD_INTERVAL.
+    """
+    last_rebuild = time.monotonic()
+    while True:
+        try:
+            if time.monotonic() - last_rebuild >= REPUTATION_REBUILD_INTERVAL:
+                await asyncio.to_thread(reputation.rebuild, DATABASE_PATH)
+                last_rebuild = time.monotonic()
+            else:
+                await asyncio.to_thread(reputation.refresh, DATABASE_PATH)
+        except sqlite3.Error as e:
+            print(f"Error refreshing caller reputation: {e}")
+        await asyncio.sleep(REPUTATION_REFRESH_INTERVAL)
+
+def known_offender_result(caller_number: str):
+    """Returns an immediate high-risk answer if caller_number has repeatedly been a scam caller, else None."""
+    if not caller_number:
+        return None
+    reputation_info = reputation.lookup(caller_number)
+    if reputation_info is None:
+        return None
+    status, _ = get_status_details(1.0)
+    return {
+        "scam_probability": 1.0,
+        "status": status,
+        "transcription": "",
+        "known_offender": True,
+        **reputation_info,
+    }
+
+async def offender_chunk_result(call_id: str, offender: dict, operation: str = "detect_scam") -> dict:
+    """
+    Answers a chunk from a known scam caller without decoding it. The chunk
+    is still recorded, with the offender score, so the call can be saved.
+    """
+    with metrics.time_stage(operation, "call_store"):
+        _, chunk_count = await run_store_op(active_calls.append_chunk, call_id, [], "")
+        await run_store_op(active_calls.record_score, call_id, chunk_count, offender["scam_probability"])
+    return offender
+
+async def update_context(call_id: str, new_text: str, operation: str = "detect_scam"):
+    """Appends a chunk's token ids to the call's context and returns (context_ids, chunk_count)."""
+    with metrics.time_stage(operation, "tokenize"):
+        new_ids = encode_text(new_text)
+    with metrics.time_stage(operation, "call_store"):
+        return await run_store_op(active_calls.append_chunk, call_id, new_ids, new_text)
+
+# --- Metrics ---
+metrics.gauge("model_load_seconds", "Time taken to load the serving model at startup.", lambda: model_load_seconds)
+metrics.gauge("active_calls", "Calls currently buffered in the call store.", lambda: active_calls.size())
+metrics.gauge("batcher_queue_depth", "Contexts waiting for the inference batcher.", lambda: batcher.stats()["queue_depth"])
+metrics.gauge("call_writer_queue_depth", "Call records waiting to be committed.", lambda: call_writer.stats()["queued"])
+metrics.gauge("prediction_cache_hits", "Context scores served from the prediction cache.", lambda: prediction_cache.hits)
+metrics.gauge("known_scam_callers", "Numbers in the caller reputation index flagged as repeat scammers.",
+              lambda: reputation.offenders.count)
+if vad is not None:
+    metrics.gauge("vad_skip_ratio", "Fraction of chunks skipped as non-speech before transcription.", lambda: vad.stats()["skip_ratio"])
+for stage in (decode_stage, transcription_stage, inference_stage):
+    metrics.gauge("stage_pending", "Jobs admitted to a stage and not yet finished.", lambda stage=stage: stage.pending, stage=stage.name)
+    metrics.gauge("stage_rejected", "Jobs a stage turned away with 503.", lambda stage=stage: stage.rejected, stage=stage.name)
 
 # --- FastAPI App ---
 app = FastAPI(title="Scam Detection API")
 
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """When PROFILE_HEADER is sent, returns this request's stage timings as a Server-Timing header."""
+    if PROFILE_HEADER not in request.headers:
+        return await call_next(request)
+    profile = {}
+    token = request_profile.set(profile)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_profile.reset(token)
+    profile["total"] = time.perf_counter() - started
+    response.headers["Server-Timing"] = ", ".join(f"{stage};dur={1000.0 * seconds:.3f}" for stage, seconds in profile.items())
+    return response
+
+@app.on_event("startup")
+async def start_batcher():
+    global eviction_task, backfill_task, reputation_task
+    warm_up(device, MODEL_DIR, INFERENCE_BACKEND)
+    await batcher.start()
+    call_writer.start()
+    eviction_task = asyncio.create_task(evict_abandoned_calls())
+    backfill_task = asyncio.create_task(backfill_search_index())
+    indexed = await asyncio.to_thread(reputation.refresh, DATABASE_PATH)
+    print(f"Caller reputation index loaded from {indexed} call records.")
+    reputation_task = asyncio.create_task(refresh_reputation())
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    for task in (eviction_task, backfill_task, reputation_task):
+        if task is not None:
+            task.cancel()
+    await batcher.stop()
+    for stage in (decode_stage, transcription_stage, inference_stage):
+        stage.shutdown()
+    call_writer.close()
+    db_pool.close()
+
+def sniff_audio_format(file_bytes: bytes) -> str:
+    """Detects the audio format of raw bytes and checks it is allowed."""
+    kind = filetype.guess(file_bytes)
+    if not kind:
+        raise HTTPException(status_code=400, detail="Could not detect file type from provided data.")
+    file_extension = kind.extension
+    if file_extension not in ALLOWED_AUDIO_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file format. Allowed formats: {', '.join(ALLOWED_AUDIO_FORMATS)}"
+        )
+    return file_extension
+
+def decode_audio_chunk(encoded_audio: str):
+    """Decodes a base64 audio chunk, validates its type and decodes it to mono 16 kHz PCM."""
+    file_bytes = base64.b64decode(encoded_audio)
+    return decode_to_pcm(file_bytes, sniff_audio_format(file_bytes))
+
+async def score_context(context_ids: list) -> float:
+    """Scores context ids, skipping the forward pass when the same context was scored recently."""
+    scam_prob = prediction_cache.get(context_ids, model_version)
+    if scam_prob is not None:
+        return scam_prob
+    if cascade is not None:
+        lexical_prob = cascade.route(context_ids)
+        if lexical_prob is not None:
+            if cascade.should_shadow():
+                task = asyncio.create_task(shadow_score(context_ids, lexical_prob))
+                shadow_tasks.add(task)
+                task.add_done_callback(shadow_tasks.discard)
+            return lexical_prob
+    with inference_stage.admit():
+        scam_prob = await batcher.score(context_ids)
+    prediction_cache.put(context_ids, model_version, scam_prob)
+    return scam_prob
+
+async def score_transcript(transcript_ids: list) -> float:
+    """
+    Scores a whole call. Transcripts that fit one window take the cached
+    score_context path; longer ones are split into overlapping windows that
+    go through the batcher MAX_BATCH_SIZE at a time, so live chunks are
+    scored in between, and are pooled with FINAL_STATUS_POOLING.
+    """
+    if len(transcript_ids) <= MAX_CONTEXT_TOKENS - 2:
+        return await score_context(transcript_ids)
+    # Windowed scores must never be served for a live context with the same ids, or vice versa.
+    cache_scope = f"windows-{WINDOW_OVERLAP}-{FINAL_STATUS_POOLING}"
+    scam_prob = prediction_cache.get(transcript_ids, model_version, cache_scope)
+    if scam_prob is None:
+        windows = split_windows(transcript_ids, MAX_CONTEXT_TOKENS, WINDOW_OVERLAP)
+        window_probs = []
+        with inference_stage.admit():
+            for start in range(0, len(windows), MAX_BATCH_SIZE):
+                group = windows[start:start + MAX_BATCH_SIZE]
+                window_probs.extend(await asyncio.gather(*(batcher.score(window) for window in group)))
+        scam_prob = pool_window_scores(window_probs, FINAL_STATUS_POOLING)
+        prediction_cache.put(transcript_ids, model_version, scam_prob, cache_scope)
+    return scam_prob
+
+async def shadow_score(context_ids: list, lexical_prob: float):
+    """Re-scores a lexically answered context with DistilBERT to measure cascade agreement."""
+    try:
+        with inference_stage.admit():
+            full_prob = await batcher.score(context_ids)
+    except StageOverloaded:
+        return
+    prediction_cache.put(context_ids, model_version, full_prob)
+    cascade.record_shadow(lexical_prob, full_prob)
+
+async def no_speech_result(call_id: str) -> dict:
+    """Answers a chunk without speech with the call's last known score, keeping the call alive."""
+    last_score = await run_store_op(active_calls.touch, call_id)
+    if last_score is None:
+        return {"scam_probability": None, "status": "No speech", "transcription": "", "speech_detected": False}
+    scam_prob = last_score[1]
+    status, _ = get_status_details(scam_prob)
+    return {"scam_probability": scam_prob, "status": status, "transcription": "", "speech_detected": False}
+
+async def score_pcm(call_id: str, pcm, operation: str = "detect_scam") -> dict:
+    """
+    Transcribes a decoded chunk, appends it to the call's context and scores
+    the context. Chunks without speech skip transcription and inference.
+    """
+    if vad is not None:
+        with metrics.time_stage(operation, "vad"):
+            pcm = await decode_stage.run(vad.trim, pcm)
+        if pcm is None:
+            return await no_speech_result(call_id)
+    try:
+        with metrics.time_stage(operation, "transcription"):
+            transcription = await transcription_engine.transcribe_async(pcm, stage=transcription_stage)
+    except NoSpeechError:
+        return await no_speech_result(call_id)
+    context, chunk_count = await update_context(call_id, transcription, operation)
+    with metrics.time_stage(operation, "inference"):
+        scam_prob = await score_context(context)
+    with metrics.time_stage(operation, "record_score"):
+        await run_store_op(active_calls.record_score, call_id, chunk_count, scam_prob)
+    status, _ = get_status_details(scam_prob)
+    return {"scam_probability": scam_prob, "status": status, "transcription": transcription, "speech_detected": True}
+
 @app.post("/detect-scam/")
 async def detect_scam(
     request: ScamDetectionRequest,
-    db: sqlite3.Connection = Depends(get_db)
 ):
-    """Detects scam probability in an audio chunk."""
+    """
+    Detects scam probability in an audio chunk. Chunks from a known scam
+    caller_number are answered immediately, without decoding the audio.
+    """
     temp_file_path = None
     try:
-        file_bytes = base64.b64decode(request.base64)
-        kind = filetype.guess(file_bytes)
-        if not kind:
-            raise HTTPException(status_code=400, detail="Could not detect file type from provided data.")
-        file_extension = kind.extension
-        if file_extension not in ALLOWED_AUDIO_FORMATS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file format. Allowed formats: {', '.join(ALLOWED_AUDIO_FORMATS)}"
-            )
-
-        wav_file = convert_audio_to_wav(file_bytes, file_format=file_extension)
-        transcription = transcribe_audio(wav_file)
-        context = update_context(call_id, transcription, tokenizer)
-        scam_prob = predict_scam(context, model, device)
-        status, _ = get_status_details(scam_prob)
-        return JSONResponse(content={"scam_probability": scam_prob, "status": status, "transcription": transcription})
+        offender = known_offender_result(request.caller_number)
+        if offender is not None:
+            return JSONResponse(content=await offender_chunk_result(request.call_id, offender))
+        with metrics.time_stage("detect_scam", "decode"):
+            pcm = await decode_stage.run(decode_audio_chunk, request.base64)
+        return JSONResponse(content=await score_pcm(request.call_id, pcm))
+    except StageOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
@@ -153,62 +406,145 @@ async def detect_scam(
         if temp_file_path and os.path.exists(temp_file_path):
             os.unlink(temp_file_path)
 
+@app.websocket("/ws/detect-scam/{call_id}")
+async def detect_scam_stream(websocket: WebSocket, call_id: str, caller_number: str = None):
+    """
+    Streams live call audio over one connection. The client may first send
+    {"format": "<ext>"} as text; otherwise the format is sniffed from the
+    first binary frame and reused for the rest of the call. Each binary frame
+    must be a self-contained audio chunk (or raw 16 kHz s16le samples for
+    "pcm") and is answered with the same JSON as /detect-scam/. Sending
+    {"action": "end", "caller_number": ..., "user_feedback": ...} saves the
+    call like /save-call/ and closes the socket. If the ?caller_number= query
+    parameter is a known scam caller, every frame gets the immediate
+    high-risk answer instead of being decoded.
+    """
+    await websocket.accept()
+    offender = known_offender_result(caller_number)
+    file_format = None
+    chunk_index = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError as e:
+                    await websocket.send_json({"error": f"Invalid control message: {e}", "status_code": 400})
+                    continue
+                if not isinstance(control, dict):
+                    await websocket.send_json({"error": "Control message must be a JSON object.", "status_code": 400})
+                    continue
+                if control.get("action") == "end":
+                    try:
+                        result = await persist_call(call_id, control.get("caller_number"), control.get("user_feedback"))
+                    except HTTPException as e:
+                        result = {"error": e.detail, "status_code": e.status_code}
+                    await websocket.send_json(result)
+                    await websocket.close()
+                    break
+                requested_format = control.get("format")
+                if requested_format not in ALLOWED_AUDIO_FORMATS + ["pcm"]:
+                    await websocket.send_json({"error": f"Unsupported format: {requested_format}", "status_code": 400})
+                    continue
+                file_format = requested_format
+                await websocket.send_json({"format": file_format})
+                continue
+
+            frame = message.get("bytes") or b""
+            chunk_index += 1
+            try:
+                if offender is not None:
+                    result = await offender_chunk_result(call_id, offender, "detect_scam_stream")
+                else:
+                    if file_format is None:
+                        file_format = sniff_audio_format(frame)
+                    with metrics.time_stage("detect_scam_stream", "decode"):
+                        pcm = await decode_stage.run(decode_to_pcm, frame, file_format)
+                    result = await score_pcm(call_id, pcm, "detect_scam_stream")
+                await websocket.send_json({"chunk": chunk_index, **result})
+            except StageOverloaded as e:
+                await websocket.send_json({"chunk": chunk_index, "error": str(e), "status_code": 503})
+            except HTTPException as e:
+                await websocket.send_json({"chunk": chunk_index, "error": e.detail, "status_code": e.status_code})
+            except Exception as e:
+                print(f"Error in detect_scam_stream: {e}")
+                await websocket.send_json({"chunk": chunk_index, "error": f"Internal server error: {e}", "status_code": 500})
+    except WebSocketDisconnect:
+        pass
+
 @app.post("/save-call/")
 async def save_call(
     call_id: str = Body(...),
     caller_number: str = Body(None),
     user_feedback: str = Body(None),
-    db: sqlite3.Connection = Depends(get_db)
 ):
     """Saves call data to the database after the call ends (with user consent)."""
-    if call_id not in active_calls:
+    return JSONResponse(content=await persist_call(call_id, caller_number, user_feedback))
+
+async def persist_call(call_id: str, caller_number: str = None, user_feedback: str = None) -> dict:
+    """Queues a finished call for writing, waiting for the commit only if SAVE_CALL_WAIT_FOR_COMMIT is set."""
+    with metrics.time_stage("save_call", "call_store"):
+        call_data = await run_store_op(active_calls.pop, call_id)
+    if call_data is None:
         raise HTTPException(status_code=404, detail="Call ID not found.")
-    call_data = active_calls.pop(call_id)
+    if any(call_data['chunks']):
+        with metrics.time_stage("save_call", "tokenize"):
+            transcript_ids = encode_text(" ".join(call_data['chunks']))
+        try:
+            with metrics.time_stage("save_call", "inference"):
+                final_scam_prob = await score_transcript(transcript_ids)
+        except StageOverloaded as e:
+            await run_store_op(active_calls.restore, call_id, call_data)
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        final_status, _ = get_status_details(final_scam_prob)
+    elif call_data['last_score'] is not None:
+        # Known-offender chunks are never transcribed; keep the score they were answered with.
+        final_status, _ = get_status_details(call_data['last_score'][1])
+    else:
+        final_status = "Unknown"
+    with metrics.time_stage("save_call", "db_enqueue"):
+        try:
+            committed = store_call(call_id, call_data, caller_number, user_feedback, final_status)
+        except HTTPException:
+            # Put the call back so the client's retry after Retry-After finds it.
+            await run_store_op(active_calls.restore, call_id, call_data)
+            raise
+    if SAVE_CALL_WAIT_FOR_COMMIT:
+        try:
+            with metrics.time_stage("save_call", "db_commit"):
+                await asyncio.wrap_future(committed)
+        except sqlite3.Error as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    return {"message": "Call data saved successfully."}
+
+def store_call(call_id: str, call_data: dict, caller_number: str, user_feedback: str, final_status: str):
+    """Queues a finished call's record, returning a Future for the commit."""
     start_time = datetime.fromtimestamp(call_data['start_time'])
     end_time = datetime.now()
     duration = end_time.timestamp() - call_data['start_time']
 
-    if call_data['chunks']:
-        last_chunk_text = call_data['chunks'][-1]
-        last_scam_prob = predict_scam(last_chunk_text, model, device)
-        final_status, _ = get_status_details(last_scam_prob)
-    else:
-        final_status = "Unknown"
-
-    cursor = db.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO call_records (
-                call_id, start_time, end_time, duration, caller_number,
-                full_transcription, user_feedback, final_status, model_version_used
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        return call_writer.submit((
             call_id,
             start_time,
             end_time,
             duration,
             caller_number,
-            call_data['context'],
+            " ".join(chunk for chunk in call_data['chunks'] if chunk),
             user_feedback,
             final_status,
             model_version
         ))
-        db.commit()
-        return JSONResponse(content={"message": "Call data saved successfully."})
-    except sqlite3.Error as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    finally:
-        cursor.close()
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Call record write queue is full.", headers={"Retry-After": "1"})
 
 @app.get("/abandoned-calls/")
 async def abandoned_calls():
-    """Removes abandoned calls from the active_calls dictionary."""
-    now = time.time()
-    abandoned_ids = [call_id for call_id, call_data in active_calls.items() if now - call_data['last_chunk_time'] > ABANDONED_CALL_TIMEOUT]
-    for call_id in abandoned_ids:
-        active_calls.pop(call_id)
-        print("Abandoned Removed")
+    """Removes abandoned calls from the active call store."""
+    abandoned_ids = await run_store_op(active_calls.remove_expired, ABANDONED_CALL_TIMEOUT)
     return JSONResponse(content={"message": f"Removed {len(abandoned_ids)} abandoned calls."})
 
 @app.get("/education/")
@@ -229,33 +565,91 @@ async def education_info():
 async def health_check():
     return {"status": "ok", "message": "Scam Detection API is running."}
 
+@app.get("/stats/")
+async def stats():
+    return {
+        "batcher": batcher.stats(),
+        "call_store": await run_store_op(active_calls.stats),
+        "decode": decode_stats.stats(),
+        "vad": vad.stats() if vad is not None else None,
+        "caller_reputation": reputation.stats(),
+        "call_writer": call_writer.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "cascade": cascade.stats() if cascade is not None else None,
+        "stages": {stage.name: stage.stats() for stage in (decode_stage, transcription_stage, inference_stage)},
+    }
+
+@app.get("/search-calls/")
+async def search_call_records(
+    q: str,
+    page: int = 1,
+    page_size: int = 20,
+    final_status: str = None,
+    db: sqlite3.Connection = Depends(get_db),
+):
+    """Full-text search over saved transcripts, best matches (bm25) first."""
+    query = fts_query(q)
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word.")
+    if page < 1 or not 1 <= page_size <= MAX_SEARCH_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page must be >= 1 and page_size between 1 and {MAX_SEARCH_PAGE_SIZE}.")
+    try:
+        total, rows = search_calls(db, query, page, page_size, final_status)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    return JSONResponse(content={
+        "query": q,
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "results": [
+            {
+                "call_id": row["call_id"],
+                "start_time": row["start_time"],
+                "caller_number": row["caller_number"],
+                "final_status": row["final_status"],
+                "user_feedback": row["user_feedback"],
+                "snippet": row["snippet"],
+                "score": -row["rank"],
+            }
+            for row in rows
+        ],
+    })
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage latency histograms and queue gauges in the Prometheus text format."""
+    # The active_calls gauge queries every shard when the store is remote.
+    return PlainTextResponse(await run_store_op(metrics.render), media_type="text/plain; version=0.0.4")
+
 @app.get("/model-info/")
-async def model_info():
+async def model_info(db: sqlite3.Connection = Depends(get_db)):
     try:
-        with sqlite3.connect(DATABASE_PATH) as db:
-            db.row_factory = sqlite3.Row
-            cursor = db.cursor()
-            cursor.execute("SELECT * FROM model_metadata ORDER BY model_id DESC LIMIT 1")
-            model_data = cursor.fetchone()
-            if model_data:
-                info = {
-                    "model_name": model_data["model_name"],
-                    "training_date": model_data["training_date"],
-                    "dataset_version": model_data["dataset_version"],
-                    "accuracy": model_data["accuracy"],
-                    "training_epochs": model_data["training_epochs"],
-                    "number_labels": model_data["number_labels"]
-                }
-            else:
-                info = {
-                    "model_name": "No model metadata found",
-                    "training_date": None,
-                    "dataset_version": None,
-                    "accuracy": None,
-                    "training_epochs": None,
-                    "number_labels": None
-                }
-            return JSONResponse(content=info)
+        cursor = db.cursor()
+        # Metadata for the model actually being served, not whichever was trained last.
+        cursor.execute("SELECT * FROM model_metadata WHERE model_dir = ? ORDER BY model_id DESC LIMIT 1", (model_version,))
+        model_data = cursor.fetchone()
+        if model_data:
+            info = {
+                "model_name": model_data["model_name"],
+                "training_date": model_data["training_date"],
+                "dataset_version": model_data["dataset_version"],
+                "accuracy": model_data["accuracy"],
+                "training_epochs": model_data["training_epochs"],
+                "number_labels": model_data["number_labels"]
+            }
+        else:
+            info = {
+                "model_name": "No model metadata found",
+                "training_date": None,
+                "dataset_version": None,
+                "accuracy": None,
+                "training_epochs": None,
+                "number_labels": None
+            }
+        info["model_version"] = model_version
+        info["inference_backend"] = INFERENCE_BACKEND
+        return JSONResponse(content=info)
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import Counter
+
+class InferenceBatcher:
+    """
+    Collects scoring requests from concurrent callers for up to max_wait_ms,
+    runs them as one padded forward pass and hands each caller its own row.
+    score_fn receives a list of inputs and must return one probability per input.
+    """
+
+    def __init__(self, score_fn, max_batch_size=16, max_wait_ms=5.0, executor=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self._queue = None
+        self._task = None
+        self.batches_run = 0
+        self.items_scored = 0
+        self.max_queue_depth = 0
+        self.total_batch_time = 0.0
+        self.batch_sizes = Counter()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher stopped."))
+
+    async def score(self, item):
+        """Queues one input and waits for its probability."""
+        if self._task is None:
+            raise RuntimeError("Inference batcher is not running.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued before waiting on the clock.
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return [(item, future) for item, future in batch if not future.cancelled()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            started = time.perf_counter()
+            try:
+                probabilities = await loop.run_in_executor(self.executor, self.score_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.total_batch_time += time.perf_counter() - started
+            self.batches_run += 1
+            self.items_scored += len(items)
+            self.batch_sizes[len(items)] += 1
+            for (_, future), probability in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result(probability)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches_run": self.batches_run,
+            "items_scored": self.items_scored,
+            "mean_batch_size": self.items_scored / self.batches_run if self.batches_run else 0.0,
+            "mean_batch_time_ms": 1000.0 * self.total_batch_time / self.batches_run if self.batches_run else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
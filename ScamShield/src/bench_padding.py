@@ -0,0 +1,98 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+import torch
+from transformers.trainer_pt_utils import LengthGroupedSampler
+from dataset_setup import load_and_prepare_dataset, tokenize_dataset, get_data_collator
+from model_registry import get_model
+
+def _peak_memory_probe():
+    """
+    Returns (source, fn) where fn() gives this process's peak memory in MB:
+    ru_maxrss on Unix, psutil's peak working set on Windows, and tracemalloc
+    (Python allocations only, not torch tensors) when neither is available.
+    """
+    try:
+        import resource
+        scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0  # ru_maxrss is bytes on macOS, KiB on Linux
+        return "ru_maxrss", lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        pass
+    try:
+        import psutil
+        process = psutil.Process()
+
+        def peak():
+            info = process.memory_info()
+            return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+        return "psutil", peak
+    except ImportError:
+        pass
+    tracemalloc.start()
+    return "tracemalloc", lambda: tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+
+def _run_mode(mode, csv_path, batch_size, max_steps):
+    """Trains for max_steps in a fresh process and returns throughput and peak memory for one padding mode."""
+    memory_source, peak_memory_mb = _peak_memory_probe()
+    torch.manual_seed(0)
+    dataset = load_and_prepare_dataset(csv_path=csv_path)
+    tokenized = tokenize_dataset(dataset, pad_to_max_length=(mode == "max_length"))
+    features = [tokenized[i] for i in range(len(tokenized))]
+    if mode == "max_length":
+        order = torch.randperm(len(features)).tolist()
+    else:
+        lengths = [len(feature["input_ids"]) for feature in features]
+        order = list(LengthGroupedSampler(batch_size, lengths=lengths))
+    collator = get_data_collator()
+
+    model, _ = get_model()
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=2e-5)
+    samples = 0
+    padded_tokens = 0
+    started = time.perf_counter()
+    for step, start in enumerate(range(0, len(order), batch_size)):
+        if step >= max_steps:
+            break
+        batch = collator([features[i] for i in order[start:start + batch_size]])
+        outputs = model(**batch)
+        outputs.loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        samples += batch["input_ids"].shape[0]
+        padded_tokens += batch["input_ids"].numel()
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "steps": min(max_steps, -(-len(order) // batch_size)),
+        "samples": samples,
+        "samples_per_sec": samples / elapsed,
+        "mean_padded_length": padded_tokens / samples if samples else 0.0,
+        "peak_memory_mb": peak_memory_mb(),
+        "memory_source": memory_source,
+    }
+
+def compare_padding(csv_path="dataset.csv", batch_size=16, max_steps=20):
+    """Runs the old fixed 512-token padding and the dynamic, length-grouped path in separate processes."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for mode in ("max_length", "dynamic"):
+        with context.Pool(1) as pool:
+            results.append(pool.apply(_run_mode, (mode, csv_path, batch_size, max_steps)))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare training throughput of fixed vs dynamic padding.")
+    parser.add_argument("--csv", default="dataset.csv")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-steps", type=int, default=20)
+    args = parser.parse_args()
+    results = compare_padding(args.csv, args.batch_size, args.max_steps)
+    print(json.dumps(results, indent=2))
+    baseline, dynamic = results
+    print(f"Speedup: {dynamic['samples_per_sec'] / baseline['samples_per_sec']:.2f}x, "
+          f"peak memory ({baseline['memory_source']}) {baseline['peak_memory_mb']:.0f} MB -> "
+          f"{dynamic['peak_memory_mb']:.0f} MB")
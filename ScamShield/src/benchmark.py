@@ -0,0 +1,231 @@
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+ALLOWED_AUDIO_FORMATS = ["mp3", "wav", "3gp", "mpeg", "m4a", "ogg", "flac"]
+# Container names ffmpeg expects for each client-facing extension
+EXPORT_FORMATS = {"mp3": "mp3", "mpeg": "mp3", "wav": "wav", "3gp": "3gp", "m4a": "ipod", "ogg": "ogg", "flac": "flac"}
+RESULTS_DIR = "benchmarks"
+SAMPLE_RATE = 16000
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+    return {
+        "count": len(ordered),
+        "mean_ms": 1000.0 * sum(ordered) / len(ordered),
+        "p50_ms": 1000.0 * rank(50),
+        "p95_ms": 1000.0 * rank(95),
+        "p99_ms": 1000.0 * rank(99),
+    }
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+def synthetic_speech(seconds=2.0, seed=0):
+    """Speech-like int16 PCM: syllable-length voiced bursts over low noise, deterministic per seed."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 4 * t) > 0).astype(np.float32)
+    # Harmonics of a 140 Hz voice shaped by formant-like peaks near 500 Hz and 1500 Hz
+    harmonics = 140.0 * np.arange(1, 21)
+    weights = np.exp(-((harmonics - 500) / 200) ** 2) + 0.5 * np.exp(-((harmonics - 1500) / 300) ** 2) + 0.1
+    voiced = (weights[:, None] * np.sin(2 * np.pi * harmonics[:, None] * t)).sum(axis=0) / weights.sum()
+    signal = envelope * voiced + 0.01 * rng.standard_normal(len(t))
+    return (signal * 32767 * 0.8).astype(np.int16)
+
+def build_fixtures(seconds=2.0):
+    """Encodes the same synthetic audio in every allowed format; formats ffmpeg cannot write are skipped."""
+    from pydub import AudioSegment
+    segment = AudioSegment(synthetic_speech(seconds).tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1)
+    fixtures, skipped = {}, {}
+    for file_format in ALLOWED_AUDIO_FORMATS:
+        buffer = io.BytesIO()
+        try:
+            segment.export(buffer, format=EXPORT_FORMATS[file_format])
+            fixtures[file_format] = buffer.getvalue()
+        except Exception as e:
+            skipped[file_format] = str(e).splitlines()[0] if str(e) else type(e).__name__
+    return fixtures, skipped
+
+def run_micro(repeat=20, include_model=True):
+    """Times each pipeline stage in isolation, offline, with the stub transcription engine."""
+    import filetype
+    from audio_decode import decode_to_pcm
+    from context_buffer import TokenRingBuffer
+    from transcription import get_engine
+
+    fixtures, skipped = build_fixtures()
+    results = {"skipped_formats": skipped, "decode": {}, "sniff": {}, "base64_decode": {}}
+    for file_format, data in fixtures.items():
+        encoded = base64.b64encode(data).decode()
+        results["base64_decode"][file_format] = time_call(lambda: base64.b64decode(encoded), repeat)
+        results["sniff"][file_format] = time_call(lambda: filetype.guess(data), repeat)
+        results["decode"][file_format] = time_call(lambda: decode_to_pcm(data, file_format), repeat)
+
+    engine = get_engine("stub")
+    pcm = decode_to_pcm(fixtures["wav"], "wav")
+    results["transcription_stub"] = time_call(lambda: engine.transcribe(pcm), repeat)
+
+    if include_model:
+        import torch
+        from model_registry import load_classifier
+        from predict import encode_text, predict_scam_ids_batch, score_long_texts
+        device = torch.device("cpu")
+        _, model, _ = load_classifier(device)
+        chunk_text = engine.transcribe(pcm)
+        buffer = TokenRingBuffer(512, 412)
+        def append_chunk():
+            buffer.extend(encode_text(chunk_text))
+        results["update_context"] = time_call(append_chunk, repeat)
+        context = buffer.to_list()
+        for batch_size in (1, 8, 16):
+            results[f"forward_batch_{batch_size}"] = time_call(
+                lambda: predict_scam_ids_batch([context] * batch_size, model, device), max(3, repeat // 4)
+            )
+        long_transcript = " ".join([chunk_text] * 200)
+        results["score_long_text"] = time_call(lambda: score_long_texts([long_transcript], model, device), 3)
+    return results
+
+def _post_json(url, payload, timeout):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return 0
+
+def run_load(base_url, concurrency=16, calls=64, chunks_per_call=5, audio_format="wav", timeout=30.0):
+    """
+    Simulates concurrent callers against a running backend (start it with
+    TRANSCRIPTION_ENGINE=stub to stay offline). Each caller sends
+    chunks_per_call chunks to /detect-scam/ and then calls /save-call/.
+    """
+    fixtures, _ = build_fixtures(seconds=1.0)
+    encoded = base64.b64encode(fixtures[audio_format]).decode()
+    latencies = {"detect-scam": [], "save-call": []}
+    statuses = {}
+    lock = threading.Lock()
+
+    def record(endpoint, started, status):
+        with lock:
+            latencies[endpoint].append(time.perf_counter() - started)
+            statuses[f"{endpoint}:{status}"] = statuses.get(f"{endpoint}:{status}", 0) + 1
+
+    def one_call(_):
+        call_id = str(uuid.uuid4())
+        for _ in range(chunks_per_call):
+            started = time.perf_counter()
+            status = _post_json(f"{base_url}/detect-scam/", {"call_id": call_id, "base64": encoded}, timeout)
+            record("detect-scam", started, status)
+        started = time.perf_counter()
+        status = _post_json(f"{base_url}/save-call/", {"call_id": call_id, "caller_number": "+910000000000"}, timeout)
+        record("save-call", started, status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_call, range(calls)))
+    elapsed = time.perf_counter() - started
+    requests = sum(len(samples) for samples in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "calls": calls,
+        "chunks_per_call": chunks_per_call,
+        "audio_format": audio_format,
+        "seconds": elapsed,
+        "requests_per_sec": requests / elapsed,
+        "status_codes": statuses,
+        "latency": {endpoint: percentiles(samples) for endpoint, samples in latencies.items()},
+    }
+
+def environment_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or "unknown",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def save_results(kind, results, output_dir=RESULTS_DIR):
+    """Writes results plus commit/machine info to <output_dir>/<kind>-<commit>-<timestamp>.json."""
+    os.makedirs(output_dir, exist_ok=True)
+    info = environment_info()
+    path = os.path.join(output_dir, f"{kind}-{info['commit']}-{info['timestamp'].replace(':', '')}.json")
+    with open(path, "w") as f:
+        json.dump({"kind": kind, "environment": info, "results": results}, f, indent=2)
+    return path
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, child, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+def compare_results(baseline_path, candidate_path):
+    """Prints every numeric metric that appears in both runs with its relative change."""
+    with open(baseline_path) as f:
+        baseline = _flatten("", json.load(f)["results"], {})
+    with open(candidate_path) as f:
+        candidate = _flatten("", json.load(f)["results"], {})
+    for key in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[key], candidate[key]
+        change = (after - before) / before * 100.0 if before else float("nan")
+        print(f"{key:60s} {before:12.3f} -> {after:12.3f} ({change:+.1f}%)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the scam detection pipeline.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    micro = subcommands.add_parser("micro", help="Per-stage micro-benchmarks, fully offline")
+    micro.add_argument("--repeat", type=int, default=20)
+    micro.add_argument("--no-model", action="store_true", help="Skip tokenizer and model stages")
+    load = subcommands.add_parser("load", help="Concurrent load against a running backend")
+    load.add_argument("--url", default="http://127.0.0.1:8000")
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--calls", type=int, default=64)
+    load.add_argument("--chunks-per-call", type=int, default=5)
+    load.add_argument("--format", choices=ALLOWED_AUDIO_FORMATS, default="wav")
+    compare = subcommands.add_parser("compare", help="Diff two saved result files")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    for sub in (micro, load):
+        sub.add_argument("--output-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare_results(args.baseline, args.candidate)
+    else:
+        if args.command == "micro":
+            results = run_micro(args.repeat, include_model=not args.no_model)
+        else:
+            results = run_load(args.url, args.concurrency, args.calls, args.chunks_per_call, args.format)
+        print(json.dumps(results, indent=2))
+        print(f"Saved to {save_results(args.command, results, args.output_dir)}")
@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import pandas as pd
+import torch
+from inference_backends import SERVING_BACKENDS
+
+MODEL_DIR = "model/scam_detector"
+DATABASE_PATH = "scam_calls.db"
+
+_worker = {}
+
+def _init_worker(torch_threads, inference_backend, pooling, model_version):
+    """Pins one model and a fixed torch thread count per worker process."""
+    from model_registry import load_classifier
+    torch.set_num_threads(torch_threads)
+    device = torch.device("cpu")
+    _, model, _ = load_classifier(device, MODEL_DIR, inference_backend)
+    _worker.update(model=model, model_version=model_version, device=device, pooling=pooling)
+
+def _score_chunk(task):
+    """Scores one chunk of (key, text) rows; runs in a worker process."""
+    from predict import score_long_texts, get_status_details
+    chunk_id, keys, texts = task
+    probabilities = score_long_texts(
+        ["" if text is None else str(text) for text in texts],
+        _worker["model"], _worker["device"], pooling=_worker["pooling"],
+    )
+    statuses = [get_status_details(prob)[0] for prob in probabilities]
+    return chunk_id, keys, probabilities, statuses, _worker["model_version"]
+
+def checkpoint_version(model_dir=MODEL_DIR):
+    """
+    Names the checkpoint the workers will load: model_dir plus a hash of its
+    files, so scoring again after retraining is a new run. Without a
+    fine-tuned model this is the base model name, as in load_classifier().
+    """
+    if not os.path.isdir(model_dir):
+        from model_registry import MODEL_NAME
+        return MODEL_NAME
+    digest = hashlib.blake2b(digest_size=8)
+    for name in sorted(os.listdir(model_dir)):
+        path = os.path.join(model_dir, name)
+        if os.path.isfile(path):
+            digest.update(name.encode())
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return f"{model_dir}@{digest.hexdigest()}"
+
+def run_id_for(source, model_version, inference_backend, pooling):
+    """Progress is only resumed within one run: the same source scored by the same checkpoint and settings."""
+    return f"{source}|{model_version}|{inference_backend}|{pooling}"
+
+def iter_sqlite_chunks(db_path, chunk_size):
+    """Streams call_records in rowid order; chunk ids are the first and last rowid, so they are stable across runs."""
+    with sqlite3.connect(db_path) as db:
+        cursor = db.execute("SELECT rowid, call_id, full_transcription FROM call_records ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield f"{rows[0][0]:012d}-{rows[-1][0]:012d}", [row[1] for row in rows], [row[2] for row in rows]
+
+def iter_csv_chunks(csv_path, chunk_size, text_column, id_column):
+    """Streams a CSV in fixed-size chunks; chunk ids are the first and last row offset."""
+    offset = 0
+    for df in pd.read_csv(csv_path, chunksize=chunk_size):
+        keys = df[id_column].astype(str).tolist() if id_column else [str(offset + i) for i in range(len(df))]
+        yield f"{offset:012d}-{offset + len(df) - 1:012d}", keys, df[text_column].tolist()
+        offset += len(df)
+
+def check_chunk_size(previous, chunk_size):
+    """Refuses to resume a run with a different chunk size, whose chunks would not line up with the finished ones."""
+    if previous is not None and previous != chunk_size:
+        raise ValueError(
+            f"This run was started with --chunk-size {previous}; resume with the same size or pass --restart."
+        )
+
+class FileSink:
+    """
+    Writes one CSV or Parquet part per chunk; a chunk is done once its part
+    file exists. A manifest ties the directory to one run, so parts from a
+    different source or checkpoint are never mistaken for finished chunks.
+    """
+
+    def __init__(self, output_dir, file_format, run_id, chunk_size, restart=False):
+        self.output_dir = output_dir
+        self.file_format = file_format
+        os.makedirs(output_dir, exist_ok=True)
+        manifest_path = os.path.join(output_dir, "manifest.json")
+        if restart:
+            for name in os.listdir(output_dir):
+                if name.startswith("part-") or name == "manifest.json":
+                    os.remove(os.path.join(output_dir, name))
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest["run_id"] != run_id:
+                raise ValueError(
+                    f"{output_dir} holds run {manifest['run_id']}; use another --output or pass --restart."
+                )
+            check_chunk_size(manifest["chunk_size"], chunk_size)
+        else:
+            with open(manifest_path, "w") as f:
+                json.dump({"run_id": run_id, "chunk_size": chunk_size}, f)
+
+    def _path(self, chunk_id):
+        return os.path.join(self.output_dir, f"part-{chunk_id}.{self.file_format}")
+
+    def is_done(self, chunk_id):
+        return os.path.exists(self._path(chunk_id))
+
+    def write(self, chunk_id, df):
+        path = self._path(chunk_id)
+        tmp_path = path + ".tmp"
+        if self.file_format == "parquet":
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+class SqliteSink:
+    """
+    Writes scores to a call_rescores table. Each chunk's rows and its
+    checkpoint row commit in one transaction, so a resumed run never
+    double-writes or skips a chunk. Rows and progress are keyed by run, so
+    re-scoring after a model update or scoring another CSV starts fresh.
+    """
+
+    def __init__(self, db_path, run_id, chunk_size, restart=False):
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS call_rescores (
+                run_id TEXT,
+                call_id TEXT,
+                model_version TEXT,
+                scam_probability REAL,
+                status TEXT,
+                scored_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (run_id, call_id)
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS bulk_score_progress (
+                run_id TEXT,
+                chunk_id TEXT,
+                chunk_size INTEGER NOT NULL,
+                PRIMARY KEY (run_id, chunk_id)
+            )
+        """)
+        if restart:
+            self.db.execute("DELETE FROM bulk_score_progress WHERE run_id = ?", (run_id,))
+        self.db.commit()
+        previous = self.db.execute(
+            "SELECT chunk_size FROM bulk_score_progress WHERE run_id = ? LIMIT 1", (run_id,)
+        ).fetchone()
+        check_chunk_size(previous and previous[0], chunk_size)
+        self.run_id = run_id
+        self.chunk_size = chunk_size
+        self._done = {row[0] for row in self.db.execute(
+            "SELECT chunk_id FROM bulk_score_progress WHERE run_id = ?", (run_id,)
+        )}
+
+    def is_done(self, chunk_id):
+        return chunk_id in self._done
+
+    def write(self, chunk_id, df):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO call_rescores (run_id, call_id, model_version, scam_probability, status) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((self.run_id, *row) for row in
+                 df[["key", "model_version", "scam_probability", "status"]].itertuples(index=False, name=None)),
+            )
+            self.db.execute(
+                "INSERT OR IGNORE INTO bulk_score_progress (run_id, chunk_id, chunk_size) VALUES (?, ?, ?)",
+                (self.run_id, chunk_id, self.chunk_size),
+            )
+        self._done.add(chunk_id)
+
+def bulk_score(chunks, sink, workers, torch_threads, model_version, inference_backend="fp32", pooling="max"):
+    """Scores every chunk not already in sink across worker processes and returns (rows, seconds)."""
+    pending = (chunk for chunk in chunks if not sink.is_done(chunk[0]))
+    context = multiprocessing.get_context("spawn")
+    rows = 0
+    started = time.perf_counter()
+    with context.Pool(workers, initializer=_init_worker, initargs=(torch_threads, inference_backend, pooling, model_version)) as pool:
+        for chunk_id, keys, probabilities, statuses, model_version in pool.imap_unordered(_score_chunk, pending):
+            sink.write(chunk_id, pd.DataFrame({
+                "key": keys,
+                "scam_probability": probabilities,
+                "status": statuses,
+                "model_version": model_version,
+            }))
+            rows += len(keys)
+            elapsed = time.perf_counter() - started
+            print(f"Scored {rows} rows in {elapsed:.1f}s ({rows / elapsed:.1f} rows/sec)")
+    return rows, time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score historical calls or a CSV with the current model.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--sqlite", default=None, help=f"Score call_records in this database (default {DATABASE_PATH})")
+    source.add_argument("--csv", default=None, help="Score a CSV instead of call_records")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--id-column", default=None, help="CSV column used as the row key (default: row number)")
+    parser.add_argument("--output", default=None,
+                        help="Directory for .csv/.parquet parts; default writes call_rescores into the SQLite database")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="parquet")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--torch-threads", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--inference-backend", choices=SERVING_BACKENDS, default="fp32")
+    parser.add_argument("--pooling", choices=("max", "mean", "attention"), default="max")
+    parser.add_argument("--restart", action="store_true", help="Discard this run's progress and score everything again")
+    args = parser.parse_args()
+
+    db_path = args.sqlite or DATABASE_PATH
+    if args.csv:
+        chunks = iter_csv_chunks(args.csv, args.chunk_size, args.text_column, args.id_column)
+        source_name = f"csv:{os.path.abspath(args.csv)}:{args.text_column}:{args.id_column}"
+    else:
+        chunks = iter_sqlite_chunks(db_path, args.chunk_size)
+        source_name = f"sqlite:{os.path.abspath(db_path)}"
+    model_version = checkpoint_version()
+    run_id = run_id_for(source_name, model_version, args.inference_backend, args.pooling)
+    print(f"Run: {run_id}")
+    try:
+        if args.output:
+            sink = FileSink(args.output, args.format, run_id, args.chunk_size, args.restart)
+        else:
+            sink = SqliteSink(db_path, run_id, args.chunk_size, args.restart)
+    except ValueError as e:
+        parser.error(str(e))
+    rows, seconds = bulk_score(chunks, sink, args.workers, args.torch_threads, model_version,
+                               args.inference_backend, args.pooling)
+    print(f"Done: {rows} rows in {seconds:.1f}s ({rows / seconds if seconds else 0.0:.1f} rows/sec)")
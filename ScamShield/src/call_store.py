@@ -0,0 +1,291 @@
+import argparse
+import bisect
+import hashlib
+import heapq
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from context_buffer import TokenRingBuffer
+
+class InProcessCallStore:
+    """
+    Live call state for one process: each call_id maps to its token-id
+    context, transcribed chunks and timing. Every method holds the store lock,
+    so append-and-score sequences for one call never interleave.
+
+    A min-heap on last_chunk_time orders calls for expiry; superseded heap
+    entries are skipped lazily, so eviction costs amortized O(log n). The
+    store also enforces hard caps on live calls and buffered context bytes
+    by evicting the least recently active calls.
+    """
+
+    def __init__(self, context_capacity, keep_on_overflow, max_calls=None, max_context_bytes=None):
+        self.context_capacity = context_capacity
+        self.keep_on_overflow = keep_on_overflow
+        self.max_calls = max_calls
+        self.max_context_bytes = max_context_bytes
+        self._calls = {}
+        self._expiry_heap = []  # (last_chunk_time, call_id), possibly stale
+        self._context_bytes = 0
+        self.evictions = {"expired": 0, "max_calls": 0, "max_context_bytes": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _call_bytes(call_data):
+        return call_data["context_ids"].nbytes + sum(len(chunk) for chunk in call_data["chunks"])
+
+    def _remove(self, call_id):
+        call_data = self._calls.pop(call_id)
+        self._context_bytes -= self._call_bytes(call_data)
+        return call_data
+
+    def _pop_oldest(self):
+        """Pops heap entries until one is current and returns its (last_chunk_time, call_id)."""
+        while self._expiry_heap:
+            last_chunk_time, call_id = heapq.heappop(self._expiry_heap)
+            call_data = self._calls.get(call_id)
+            if call_data is not None and call_data["last_chunk_time"] == last_chunk_time:
+                return last_chunk_time, call_id
+        return None
+
+    def _enforce_caps(self):
+        while self.max_calls is not None and len(self._calls) > self.max_calls:
+            _, call_id = self._pop_oldest()
+            self._remove(call_id)
+            self.evictions["max_calls"] += 1
+        while self.max_context_bytes is not None and self._context_bytes > self.max_context_bytes and self._calls:
+            _, call_id = self._pop_oldest()
+            self._remove(call_id)
+            self.evictions["max_context_bytes"] += 1
+        # Rebuild once stale entries dominate so the heap stays O(live calls).
+        if len(self._expiry_heap) > 2 * len(self._calls) + 64:
+            self._expiry_heap = [(call_data["last_chunk_time"], call_id) for call_id, call_data in self._calls.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def append_chunk(self, call_id, new_ids, text, now=None):
+        """
+        Creates the call if needed, appends a chunk and returns
+        (context_ids, chunk_count) as of this chunk.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            call_data = self._calls.get(call_id)
+            if call_data is None:
+                call_data = self._calls[call_id] = {
+                    "context_ids": TokenRingBuffer(self.context_capacity, self.keep_on_overflow),
+                    "chunk_count": 0,
+                    "start_time": now,
+                    "last_chunk_time": now,
+                    "chunks": [],
+                    "last_score": None,
+                }
+                self._context_bytes += call_data["context_ids"].nbytes
+            call_data["context_ids"].extend(new_ids)
+            call_data["chunk_count"] += 1
+            call_data["last_chunk_time"] = now
+            call_data["chunks"].append(text)
+            self._context_bytes += len(text)
+            heapq.heappush(self._expiry_heap, (now, call_id))
+            result = call_data["context_ids"].to_list(), call_data["chunk_count"]
+            self._enforce_caps()
+            return result
+
+    def record_score(self, call_id, chunk_count, scam_prob):
+        """Stores a chunk's score unless a later chunk has already been scored."""
+        with self._lock:
+            call_data = self._calls.get(call_id)
+            if call_data is None:
+                return False
+            last_score = call_data["last_score"]
+            if last_score is not None and last_score[0] > chunk_count:
+                return False
+            call_data["last_score"] = (chunk_count, scam_prob)
+            return True
+
+    def restore(self, call_id, call_data):
+        """
+        Puts back a call popped by a save that then failed, so the client can
+        retry. Chunks that arrived for the call in the meantime are kept after
+        the restored ones.
+        """
+        with self._lock:
+            current = self._calls.get(call_id)
+            if current is not None:
+                self._remove(call_id)
+                call_data["context_ids"].extend(current["context_ids"].to_list())
+                call_data["chunks"].extend(current["chunks"])
+                call_data["chunk_count"] += current["chunk_count"]
+                call_data["last_chunk_time"] = current["last_chunk_time"]
+                call_data["last_score"] = current["last_score"] or call_data["last_score"]
+            self._calls[call_id] = call_data
+            self._context_bytes += self._call_bytes(call_data)
+            heapq.heappush(self._expiry_heap, (call_data["last_chunk_time"], call_id))
+            self._enforce_caps()
+
+    def touch(self, call_id, now=None):
+        """
+        Marks a call as alive without adding a chunk (e.g. a silent chunk) and
+        returns its last (chunk_count, scam_prob) score, or None.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            call_data = self._calls.get(call_id)
+            if call_data is None:
+                return None
+            call_data["last_chunk_time"] = now
+            heapq.heappush(self._expiry_heap, (now, call_id))
+            self._enforce_caps()
+            return call_data["last_score"]
+
+    def get(self, call_id):
+        with self._lock:
+            return self._calls.get(call_id)
+
+    def pop(self, call_id):
+        with self._lock:
+            if call_id not in self._calls:
+                return None
+            return self._remove(call_id)
+
+    def contains(self, call_id):
+        with self._lock:
+            return call_id in self._calls
+
+    def size(self):
+        with self._lock:
+            return len(self._calls)
+
+    def remove_expired(self, timeout, now=None):
+        """Drops calls with no chunk for more than timeout seconds and returns their ids."""
+        now = time.time() if now is None else now
+        expired_ids = []
+        with self._lock:
+            while self._expiry_heap and now - self._expiry_heap[0][0] > timeout:
+                oldest = self._pop_oldest()
+                if oldest is None:
+                    break
+                last_chunk_time, call_id = oldest
+                if now - last_chunk_time <= timeout:
+                    heapq.heappush(self._expiry_heap, oldest)
+                    break
+                self._remove(call_id)
+                expired_ids.append(call_id)
+            self.evictions["expired"] += len(expired_ids)
+            return expired_ids
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_calls": len(self._calls),
+                "context_bytes": self._context_bytes,
+                "max_calls": self.max_calls,
+                "max_context_bytes": self.max_context_bytes,
+                "evictions": dict(self.evictions),
+            }
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, so adding a shard only moves ~1/N of the calls."""
+
+    def __init__(self, nodes, replicas=64):
+        self._ring = sorted((self._hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def node_for(self, key):
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+class ShardedCallStore:
+    """Routes each call_id to one of several stores (usually remote) by consistent hashing."""
+
+    def __init__(self, stores):
+        self.stores = dict(stores)
+        self.ring = HashRing(list(self.stores))
+
+    def shard_for(self, call_id):
+        return self.stores[self.ring.node_for(call_id)]
+
+    def append_chunk(self, call_id, new_ids, text, now=None):
+        return self.shard_for(call_id).append_chunk(call_id, new_ids, text, now)
+
+    def record_score(self, call_id, chunk_count, scam_prob):
+        return self.shard_for(call_id).record_score(call_id, chunk_count, scam_prob)
+
+    def restore(self, call_id, call_data):
+        return self.shard_for(call_id).restore(call_id, call_data)
+
+    def touch(self, call_id, now=None):
+        return self.shard_for(call_id).touch(call_id, now)
+
+    def get(self, call_id):
+        return self.shard_for(call_id).get(call_id)
+
+    def pop(self, call_id):
+        return self.shard_for(call_id).pop(call_id)
+
+    def contains(self, call_id):
+        return self.shard_for(call_id).contains(call_id)
+
+    def size(self):
+        return sum(store.size() for store in self.stores.values())
+
+    def remove_expired(self, timeout, now=None):
+        expired_ids = []
+        for store in self.stores.values():
+            expired_ids.extend(store.remove_expired(timeout, now))
+        return expired_ids
+
+    def stats(self):
+        return {address: store.stats() for address, store in self.stores.items()}
+
+class CallStoreManager(BaseManager):
+    """Serves an InProcessCallStore to other processes over a local socket."""
+
+CallStoreManager.register("get_store")
+
+def connect_call_store(address, authkey):
+    """Returns a proxy to the store served at address ("host:port")."""
+    host, port = address.rsplit(":", 1)
+    manager = CallStoreManager(address=(host, int(port)), authkey=authkey)
+    manager.connect()
+    return manager.get_store()
+
+def create_call_store(addresses, authkey, context_capacity, keep_on_overflow, max_calls=None, max_context_bytes=None):
+    """
+    Builds the store the backend should use: in-process when no addresses
+    are configured, otherwise sharded across the call-store servers (which
+    apply their own caps).
+    """
+    if not addresses:
+        return InProcessCallStore(context_capacity, keep_on_overflow, max_calls, max_context_bytes)
+    # Shards unpickle whatever an authenticated client sends, so there is no default key.
+    if not authkey:
+        raise ValueError("CALL_STORE_AUTHKEY must be set when CALL_STORE_ADDRESSES is.")
+    return ShardedCallStore({address: connect_call_store(address, authkey) for address in addresses})
+
+def serve_call_store(host, port, authkey, context_capacity, keep_on_overflow, max_calls=None, max_context_bytes=None):
+    store = InProcessCallStore(context_capacity, keep_on_overflow, max_calls, max_context_bytes)
+    CallStoreManager.register("get_store", callable=lambda: store)
+    manager = CallStoreManager(address=(host, port), authkey=authkey)
+    server = manager.get_server()
+    print(f"Call store listening on {host}:{port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one call-state shard for multi-worker backends.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50000)
+    parser.add_argument("--authkey", required=True,
+                        help="Shared secret clients must present; use the same value as CALL_STORE_AUTHKEY")
+    parser.add_argument("--context-capacity", type=int, default=512)
+    parser.add_argument("--keep-on-overflow", type=int, default=412)
+    parser.add_argument("--max-calls", type=int, default=None)
+    parser.add_argument("--max-context-bytes", type=int, default=None)
+    args = parser.parse_args()
+    serve_call_store(
+        args.host, args.port, args.authkey.encode(), args.context_capacity, args.keep_on_overflow,
+        args.max_calls, args.max_context_bytes,
+    )
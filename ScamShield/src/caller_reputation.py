@@ -0,0 +1,194 @@
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+from array import array
+
+REPUTATION_CAPACITY = 10_000_000  # Flagged numbers the Bloom filter is sized for
+REPUTATION_ERROR_RATE = 0.001  # Bloom filter false-positive rate at capacity
+SKETCH_WIDTH = 1 << 20  # Counters per count-min sketch row
+SKETCH_DEPTH = 4
+MIN_SCAM_REPORTS = 2  # User-confirmed scam calls from a number before it is treated as a known offender
+REFRESH_BATCH_SIZE = 5000
+
+def normalize_number(number):
+    """Reduces a phone number to its digits, keeping a leading +, so formatting differences don't matter."""
+    if not number:
+        return None
+    digits = re.sub(r"\D", "", number)
+    if not digits:
+        return None
+    return ("+" if number.strip().startswith("+") else "") + digits
+
+def _hash_pair(key):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+class BloomFilter:
+    """Fixed-size set membership with no false negatives, using k double-hashed blake2b probes."""
+
+    def __init__(self, capacity=REPUTATION_CAPACITY, error_rate=REPUTATION_ERROR_RATE):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        h1, h2 = _hash_pair(key)
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+class CountMinSketch:
+    """Approximate per-key counts in fixed memory. Estimates never undercount."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _columns(self, key):
+        h1, h2 = _hash_pair(key)
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Adds count and returns the new estimate."""
+        estimate = None
+        for row, column in zip(self.rows, self._columns(key)):
+            row[column] += count
+            estimate = row[column] if estimate is None else min(estimate, row[column])
+        return estimate
+
+    def estimate(self, key):
+        return min(row[column] for row, column in zip(self.rows, self._columns(key)))
+
+    @property
+    def nbytes(self):
+        return sum(row.itemsize * len(row) for row in self.rows)
+
+def is_confirmed_scam(final_status, user_feedback):
+    """
+    True when the user's feedback says the call was a scam, labelling it the
+    same way training does. Calls without feedback never count, so the
+    model's own verdicts (including known-offender answers) cannot flag a number.
+    """
+    is_scam = final_status == "Scam"
+    if user_feedback == "correct":
+        return is_scam
+    if user_feedback == "incorrect":
+        return not is_scam
+    return False
+
+class CallerReputationIndex:
+    """
+    In-memory caller reputation built from call_records. Count-min sketches
+    track calls and user-confirmed scam calls per number; numbers with
+    MIN_SCAM_REPORTS confirmed scams go into a Bloom filter of known
+    offenders. Every lookup is a fixed number of hash probes and memory does
+    not grow with the number of callers. refresh() reads only rows saved
+    since the previous refresh; neither structure can forget a number, so
+    rebuild() recounts the whole table to pick up corrected feedback.
+    """
+
+    def __init__(self, capacity=REPUTATION_CAPACITY, error_rate=REPUTATION_ERROR_RATE,
+                 sketch_width=SKETCH_WIDTH, sketch_depth=SKETCH_DEPTH, min_scam_reports=MIN_SCAM_REPORTS):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
+        self.offenders = BloomFilter(capacity, error_rate)
+        self.call_counts = CountMinSketch(sketch_width, sketch_depth)
+        self.scam_counts = CountMinSketch(sketch_width, sketch_depth)
+        self.min_scam_reports = min_scam_reports
+        self.last_rowid = 0
+        self.calls_indexed = 0
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def record(self, caller_number, final_status, user_feedback=None):
+        number = normalize_number(caller_number)
+        if number is None:
+            return
+        with self._lock:
+            self.calls_indexed += 1
+            self.call_counts.add(number)
+            if is_confirmed_scam(final_status, user_feedback):
+                if self.scam_counts.add(number) >= self.min_scam_reports and number not in self.offenders:
+                    self.offenders.add(number)
+
+    def lookup(self, caller_number):
+        """Returns {"scam_reports", "calls"} for a known offender, else None."""
+        number = normalize_number(caller_number)
+        if number is None:
+            return None
+        with self._lock:
+            self.lookups += 1
+            # Requiring the sketch to agree makes a Bloom false positive alone not enough to flag a number.
+            if number not in self.offenders:
+                return None
+            scam_reports = self.scam_counts.estimate(number)
+            if scam_reports < self.min_scam_reports:
+                return None
+            self.hits += 1
+            return {"scam_reports": scam_reports, "calls": self.call_counts.estimate(number)}
+
+    def refresh(self, db_path, batch_size=REFRESH_BATCH_SIZE):
+        """Indexes call_records rows saved since the last refresh and returns how many were read."""
+        read = 0
+        db = sqlite3.connect(db_path)
+        try:
+            while True:
+                rows = db.execute("""
+                    SELECT rowid, caller_number, final_status, user_feedback FROM call_records
+                    WHERE rowid > ? ORDER BY rowid LIMIT ?
+                """, (self.last_rowid, batch_size)).fetchall()
+                if not rows:
+                    break
+                for _, caller_number, final_status, user_feedback in rows:
+                    self.record(caller_number, final_status, user_feedback)
+                self.last_rowid = rows[-1][0]
+                read += len(rows)
+        finally:
+            db.close()
+        return read
+
+    def rebuild(self, db_path, batch_size=REFRESH_BATCH_SIZE):
+        """
+        Recounts every call_records row into fresh structures and swaps them
+        in, so numbers whose scam reports were corrected are no longer
+        flagged. Lookups keep using the old index until the swap. Returns the
+        number of rows read.
+        """
+        fresh = CallerReputationIndex(self.capacity, self.error_rate, self.sketch_width,
+                                      self.sketch_depth, self.min_scam_reports)
+        read = fresh.refresh(db_path, batch_size)
+        with self._lock:
+            self.offenders = fresh.offenders
+            self.call_counts = fresh.call_counts
+            self.scam_counts = fresh.scam_counts
+            self.last_rowid = fresh.last_rowid
+            self.calls_indexed = fresh.calls_indexed
+        return read
+
+    def stats(self):
+        with self._lock:
+            return {
+                "known_offenders": self.offenders.count,
+                "calls_indexed": self.calls_indexed,
+                "last_rowid": self.last_rowid,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "memory_bytes": self.offenders.nbytes + self.call_counts.nbytes + self.scam_counts.nbytes,
+            }
@@ -0,0 +1,69 @@
+from array import array
+
+class TokenRingBuffer:
+    """
+    Fixed-capacity ring of token ids holding one call's rolling context.
+    Appending only touches the new ids; once the buffer would exceed its
+    capacity, the oldest ids are dropped so that keep_on_overflow remain,
+    mirroring the MAX_CONTEXT_TOKENS / CONTEXT_TRUNCATION rule on text.
+    """
+
+    __slots__ = ("capacity", "keep_on_overflow", "_data", "_start", "_length")
+
+    def __init__(self, capacity, keep_on_overflow=None):
+        if keep_on_overflow is None:
+            keep_on_overflow = capacity
+        if not 0 < keep_on_overflow <= capacity:
+            raise ValueError("keep_on_overflow must be between 1 and capacity.")
+        self.capacity = capacity
+        self.keep_on_overflow = keep_on_overflow
+        self._data = array("l", bytes(array("l").itemsize * capacity))
+        self._start = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def nbytes(self):
+        return self._data.itemsize * self.capacity
+
+    def extend(self, ids):
+        """Appends new token ids, applying the truncation rule on overflow."""
+        ids = list(ids)
+        total = self._length + len(ids)
+        if total > self.capacity:
+            drop = total - self.keep_on_overflow
+            if drop >= self._length:
+                ids = ids[drop - self._length:]
+                self._start = 0
+                self._length = 0
+            else:
+                self._start = (self._start + drop) % self.capacity
+                self._length -= drop
+        end = (self._start + self._length) % self.capacity
+        for token_id in ids:
+            self._data[end] = token_id
+            end += 1
+            if end == self.capacity:
+                end = 0
+        self._length += len(ids)
+
+    def to_list(self):
+        """Returns the buffered ids, oldest first."""
+        end = self._start + self._length
+        if end <= self.capacity:
+            return self._data[self._start:end].tolist()
+        return self._data[self._start:].tolist() + self._data[:end - self.capacity].tolist()
+
+    def clear(self):
+        self._start = 0
+        self._length = 0
+
+    def __getstate__(self):
+        return (self.capacity, self.keep_on_overflow, self.to_list())
+
+    def __setstate__(self, state):
+        capacity, keep_on_overflow, ids = state
+        self.__init__(capacity, keep_on_overflow)
+        self.extend(ids)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from datasets import Dataset, concatenate_datasets, load_from_disk
+from dataset_setup import tokenize_dataset
+
+TOKENIZED_CACHE_DIR = "cache/tokenized"
+
+def tokenizer_fingerprint(tokenizer):
+    """Identifies a tokenizer by class, source and vocabulary, so a changed vocab never reuses old ids."""
+    digest = hashlib.sha256()
+    digest.update(type(tokenizer).__name__.encode())
+    digest.update(str(tokenizer.name_or_path).encode())
+    digest.update(str(tokenizer.model_max_length).encode())
+    for token, token_id in sorted(tokenizer.get_vocab().items(), key=lambda item: item[1]):
+        digest.update(f"{token_id}\x1f{token}\x1e".encode())
+    return digest.hexdigest()[:16]
+
+def row_hashes(df):
+    """Returns one content hash per (text, label) row."""
+    return [
+        hashlib.sha256(f"{text}\x1f{label}".encode()).hexdigest()
+        for text, label in zip(df["text"].astype(str), df["label"])
+    ]
+
+def rows_fingerprint(hashes):
+    digest = hashlib.sha256()
+    for row_hash in hashes:
+        digest.update(row_hash.encode())
+    return digest.hexdigest()[:24]
+
+class TokenizedDatasetCache:
+    """
+    On-disk cache of tokenized Arrow shards, keyed by the content of the
+    source rows plus the tokenizer identity. Shards are reopened with
+    load_from_disk, which memory-maps them instead of re-tokenizing.
+    """
+
+    def __init__(self, tokenizer, cache_dir=TOKENIZED_CACHE_DIR):
+        self.root = os.path.join(cache_dir, tokenizer_fingerprint(tokenizer))
+        os.makedirs(os.path.join(self.root, "shards"), exist_ok=True)
+
+    def _shard_path(self, key):
+        return os.path.join(self.root, "shards", key)
+
+    def _tokenize_shard(self, df, key):
+        path = self._shard_path(key)
+        dataset = Dataset.from_pandas(df[["text", "label"]].reset_index(drop=True), preserve_index=False)
+        tokenize_dataset(dataset).save_to_disk(path)
+        return load_from_disk(path)
+
+    def get_or_tokenize(self, df):
+        """Returns the tokenized dataset for exactly these rows, tokenizing only on a cache miss."""
+        key = rows_fingerprint(row_hashes(df))
+        path = self._shard_path(key)
+        if os.path.exists(path):
+            return load_from_disk(path)
+        return self._tokenize_shard(df, key)
+
+    def _manifest_path(self, name):
+        return os.path.join(self.root, f"{name}.json")
+
+    def has_dataset(self, name):
+        return os.path.exists(self._manifest_path(name))
+
+    def extend(self, name, df):
+        """
+        Maintains an append-only tokenized dataset called name. Rows already
+        in one of its shards are skipped; only new rows are tokenized, into a
+        new shard. df may be None when there is nothing new. Returns all of
+        the dataset's shards concatenated, or None if it has no rows yet.
+        """
+        manifest_path = self._manifest_path(name)
+        manifest = {"shards": [], "row_hashes": []}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        known = set(manifest["row_hashes"])
+        hashes = row_hashes(df) if df is not None else []
+        is_new = [row_hash not in known for row_hash in hashes]
+        if any(is_new):
+            new_df = df[is_new]
+            new_hashes = [row_hash for row_hash, new in zip(hashes, is_new) if new]
+            key = rows_fingerprint(new_hashes)
+            if not os.path.exists(self._shard_path(key)):
+                self._tokenize_shard(new_df, key)
+            manifest["shards"].append(key)
+            manifest["row_hashes"].extend(new_hashes)
+            with open(manifest_path + ".tmp", "w") as f:
+                json.dump(manifest, f)
+            os.replace(manifest_path + ".tmp", manifest_path)
+            print(f"Tokenized {len(new_df)} new rows for '{name}'.")
+        if not manifest["shards"]:
+            return None
+        return concatenate_datasets([load_from_disk(self._shard_path(key)) for key in manifest["shards"]])
@@ -1,11 +1,7 @@
 import pandas as pd
 from datasets import Dataset
-from transformers import DistilBertTokenizer
-
-MODEL_NAME = "distilbert-base-uncased"
-CACHE_DIR = "./hf_models"
-
-tokenizer = DistilBertTokenizer.from_pretrained(MODEL_NAME, cache_dir=CACHE_DIR)
+from transformers import DataCollatorWithPadding
+from model_registry import get_tokenizer
 
 def load_and_prepare_dataset(csv_path="dataset.csv"):
     try:
@@ -26,10 +22,21 @@ def load_and_prepare_dataset(csv_path="dataset.csv"):
     except Exception as e:
         raise Exception(f"Error loading or preparing dataset: {e}")
 
-def tokenize_dataset(dataset):
+def tokenize_dataset(dataset, pad_to_max_length=False):
+    """
+    Tokenizes the text column. By default examples are left unpadded and
+    padded per batch by get_data_collator(); pad_to_max_length restores the
+    old fixed 512-token examples.
+    """
+    tokenizer = get_tokenizer()
+    padding = "max_length" if pad_to_max_length else False
     def tokenize_function(examples):
-        return tokenizer(examples["text"], padding="max_length", truncation=True)
+        return tokenizer(examples["text"], padding=padding, truncation=True)
     tokenized_dataset = dataset.map(tokenize_function, batched=True)
     if "text" in tokenized_dataset.column_names:
         tokenized_dataset = tokenized_dataset.remove_columns(["text"])
-    return tokenized_dataset
\ No newline at end of file
+    return tokenized_dataset
+
+def get_data_collator():
+    """Pads each batch to its longest example instead of to 512 tokens."""
+    return DataCollatorWithPadding(get_tokenizer())
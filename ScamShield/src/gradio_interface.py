@@ -1,50 +1,145 @@
+import asyncio
 import gradio as gr
+import os
+import numpy as np
 import torch
-from train import train_model
-from predict import convert_audio_to_wav, transcribe_audio, predict_scam, get_status_details
+from concurrent.futures import ThreadPoolExecutor
+from model_registry import load_classifier, warm_up
+from predict import transcribe_audio, score_long_text, score_long_texts, predict_scam_ids_batch, encode_text, get_status_details
+from transcription import get_engine
+from audio_decode import decode_to_pcm, pcm_from_array, TARGET_SAMPLE_RATE
+from context_buffer import TokenRingBuffer
 import mimetypes
 
+TRANSCRIPTION_ENGINE = os.environ.get("TRANSCRIPTION_ENGINE", "google")  # google, sphinx or stub
+QUEUE_CONCURRENCY = int(os.environ.get("GRADIO_CONCURRENCY", "4"))  # Events Gradio runs at once
+BATCH_WORKERS = 8  # Files decoded and transcribed in parallel in batch mode
+STREAM_CHUNK_SECONDS = 3.0  # Microphone audio buffered before each transcription
+MAX_CONTEXT_TOKENS = 512
+CONTEXT_TRUNCATION = 100
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-# Load the model (this loads from MODEL_DIR if available)
-model, tokenizer, _ = train_model()
-model.to(device)
-model.eval()
+# Load the shared model (from MODEL_DIR if available) without going through the trainer
+tokenizer, model, _ = load_classifier(device)
+transcription_engine = get_engine(TRANSCRIPTION_ENGINE)
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="gradio-batch")
 
-def scam_detection_interface(audio_file_path):
-    try:
-        # Determine the file format from the file path
-        mime_type, _ = mimetypes.guess_type(audio_file_path)
-        if mime_type:
-            file_format = mime_type.split("/")[-1]
-            if file_format == "mpeg": 
-                file_format = "mp3"
-            if file_format == "wave":
-                file_format = "wav"
-            if file_format == "3gpp":
-                file_format = "3gp"
-        else:
-            file_format = "wav"  # Default
+def guess_file_format(audio_file_path):
+    """Determines the file format from the file path, defaulting to wav."""
+    mime_type, _ = mimetypes.guess_type(audio_file_path)
+    if not mime_type:
+        return "wav"
+    file_format = mime_type.split("/")[-1]
+    if file_format.startswith("x-"):  # e.g. audio/x-wav
+        file_format = file_format[2:]
+    if file_format == "mpeg":
+        file_format = "mp3"
+    if file_format == "wave":
+        file_format = "wav"
+    if file_format == "3gpp":
+        file_format = "3gp"
+    return file_format
 
-        # Read file bytes and convert to wav using pydub
-        with open(audio_file_path, "rb") as f:
-            file_bytes = f.read()
+def decode_file(audio_file_path):
+    """Reads a file and decodes it to PCM (WAV in place, other formats via pydub)."""
+    with open(audio_file_path, "rb") as f:
+        file_bytes = f.read()
+    return decode_to_pcm(file_bytes, guess_file_format(audio_file_path))
 
-        wav_file = convert_audio_to_wav(file_bytes, file_format)
-        transcription = transcribe_audio(wav_file)
-        scam_prob = predict_scam(transcription, model, device)
-        status, color = get_status_details(scam_prob)
+def transcribe_file(audio_file_path):
+    """Decodes a file and transcribes it."""
+    return transcribe_audio(decode_file(audio_file_path), transcription_engine)
 
-        status_box_html = f"""
+def status_box(scam_prob):
+    status, color = get_status_details(scam_prob)
+    return f"""
         <div style="padding: 10px; border: 1px solid #ccc; border-radius: 8px; display: flex; align-items: center; background-color: #fff;">
             <div style="flex:1; font-weight: bold; color: {color};">{status}</div>
             <div style="width: 20px; height: 20px; border-radius: 50%; background-color: {color};"></div>
         </div>
         """
+
+def scam_detection_interface(audio_file_path):
+    try:
+        transcription = transcribe_file(audio_file_path)
+        scam_prob = score_long_text(transcription, model, device)
         result_text = f"Transcription: {transcription}\nScam Probability: {scam_prob:.2f}"
-        return result_text, status_box_html
+        return result_text, status_box(scam_prob)
     except Exception as e:
         return f"Error: {str(e)}", ""
 
+async def batch_detection_interface(audio_file_paths):
+    """
+    Decodes every uploaded file in parallel, transcribes them together with
+    the engine's transcribe_batch, then scores all transcriptions in batched
+    forward passes. Returns one table row per file.
+    """
+    if not audio_file_paths:
+        return []
+    loop = asyncio.get_running_loop()
+    decoded = await asyncio.gather(
+        *(loop.run_in_executor(batch_executor, decode_file, path) for path in audio_file_paths),
+        return_exceptions=True,
+    )
+    rows = [None] * len(audio_file_paths)
+    decoded_indexes = []
+    for i, (path, pcm) in enumerate(zip(audio_file_paths, decoded)):
+        if isinstance(pcm, Exception):
+            rows[i] = [os.path.basename(path), "Error", None, str(pcm)]
+        else:
+            decoded_indexes.append(i)
+    results = await transcription_engine.transcribe_batch([decoded[i] for i in decoded_indexes], batch_executor)
+    transcribed, transcriptions = [], []
+    for i, result in zip(decoded_indexes, results):
+        if isinstance(result, Exception):
+            rows[i] = [os.path.basename(audio_file_paths[i]), "Error", None, str(result)]
+        else:
+            transcriptions.append(result)
+            transcribed.append(i)
+    if transcriptions:
+        for i, transcription, scam_prob in zip(transcribed, transcriptions, score_long_texts(transcriptions, model, device)):
+            status, _ = get_status_details(scam_prob)
+            rows[i] = [os.path.basename(audio_file_paths[i]), status, round(scam_prob, 4), transcription]
+    return rows
+
+def new_stream_state():
+    return {
+        "pending": [],
+        "pending_samples": 0,
+        "context": TokenRingBuffer(MAX_CONTEXT_TOKENS, MAX_CONTEXT_TOKENS - CONTEXT_TRUNCATION),
+        "transcript": [],
+        "scam_prob": None,
+    }
+
+def stream_detection_interface(audio_chunk, state):
+    """
+    Buffers microphone audio and, every STREAM_CHUNK_SECONDS, transcribes the
+    new audio, appends its token ids to the rolling context and rescores only
+    that context, so each update costs one chunk rather than the whole call.
+    """
+    state = state or new_stream_state()
+    if audio_chunk is not None:
+        sample_rate, samples = audio_chunk
+        pcm = pcm_from_array(samples, sample_rate)
+        state["pending"].append(pcm.samples)
+        state["pending_samples"] += len(pcm.samples)
+    if state["pending_samples"] >= STREAM_CHUNK_SECONDS * TARGET_SAMPLE_RATE:
+        pcm = pcm_from_array(np.concatenate(state["pending"]), TARGET_SAMPLE_RATE)
+        state["pending"], state["pending_samples"] = [], 0
+        try:
+            transcription = transcribe_audio(pcm, transcription_engine)
+        except Exception as e:
+            print(f"Error transcribing microphone audio: {e}")
+            transcription = ""
+        if transcription:
+            state["transcript"].append(transcription)
+            state["context"].extend(encode_text(transcription))
+            state["scam_prob"] = predict_scam_ids_batch([state["context"].to_list()], model, device)[0]
+    if state["scam_prob"] is None:
+        return "Listening...", "", state
+    result_text = f"Transcription: {' '.join(state['transcript'])}\nScam Probability: {state['scam_prob']:.2f}"
+    return result_text, status_box(state["scam_prob"]), state
+
 def education_module():
     content = """
     <h2>Scam Detection Educational Module</h2>
@@ -86,6 +181,23 @@ with gr.Blocks(css="""
             detect_button = gr.Button("Detect Scam")
             detect_button.click(fn=scam_detection_interface, inputs=audio_input,
                                 outputs=[result_text_output, status_html_output])
+        with gr.TabItem("Batch"):
+            gr.Markdown("## Upload Several Recorded Calls at Once")
+            batch_input = gr.File(file_count="multiple", type="filepath", label="Select Audio Files")
+            batch_button = gr.Button("Detect Scams")
+            batch_output = gr.Dataframe(headers=["File", "Status", "Scam Probability", "Transcription"],
+                                        label="Batch Results", interactive=False)
+            batch_button.click(fn=batch_detection_interface, inputs=batch_input, outputs=batch_output)
+        with gr.TabItem("Live Microphone"):
+            gr.Markdown("## Score a Call Live from the Microphone")
+            stream_state = gr.State(None)
+            mic_input = gr.Audio(sources=["microphone"], type="numpy", streaming=True, label="Microphone")
+            with gr.Row():
+                stream_text_output = gr.Textbox(label="Live Result", interactive=False)
+                stream_html_output = gr.HTML(label="Scam Status")
+            mic_input.stream(fn=stream_detection_interface, inputs=[mic_input, stream_state],
+                             outputs=[stream_text_output, stream_html_output, stream_state])
+            mic_input.start_recording(fn=lambda: None, outputs=stream_state)
         with gr.TabItem("Education"):
             gr.Markdown("## Scam Prevention Information")
             education_output = gr.HTML(label="Educational Content", value=education_module())
@@ -93,4 +205,6 @@ with gr.Blocks(css="""
     gr.Markdown("### Powered by Real-Time Scam Detection Prototype")
 
 if __name__ == "__main__":
+    warm_up(device)
+    demo.queue(default_concurrency_limit=QUEUE_CONCURRENCY)
     demo.launch(share=True, debug=True)
\ No newline at end of file
@@ -0,0 +1,124 @@
+import argparse
+import copy
+import time
+import torch
+import pandas as pd
+from types import SimpleNamespace
+
+INFERENCE_BACKENDS = ("fp32", "int8", "torchscript")
+# torchscript ran at ~0.07x fp32 speed on the test model; it stays parity-check only until a benchmark shows a win.
+SERVING_BACKENDS = ("fp32", "int8")
+TRACE_LENGTH_BUCKETS = (32, 64, 128, 256, 512)
+
+class _LogitsOnly(torch.nn.Module):
+    """Makes the classifier return a bare logits tensor, whatever output type transformers gives it."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
+        return outputs[0] if isinstance(outputs, tuple) else outputs.logits
+
+class TracedClassifier(torch.nn.Module):
+    """
+    Runs a frozen TorchScript graph of the classifier. One graph is traced
+    per sequence-length bucket and inputs are padded up to the bucket, since
+    traced graphs are only valid for the shapes they saw. trace_all_buckets()
+    traces them up front so no request pays the trace cost.
+    """
+
+    def __init__(self, model, pad_token_id):
+        super().__init__()
+        self.model = model
+        self.pad_token_id = pad_token_id
+        self._graphs = {}
+
+    def _graph_for(self, length):
+        if length not in self._graphs:
+            example_ids = torch.full((1, length), self.pad_token_id, dtype=torch.long, device=self.model.device)
+            example_mask = torch.ones_like(example_ids)
+            with torch.no_grad():
+                traced = torch.jit.trace(_LogitsOnly(self.model), (example_ids, example_mask), strict=False)
+                self._graphs[length] = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+        return self._graphs[length]
+
+    def trace_all_buckets(self):
+        for length in TRACE_LENGTH_BUCKETS:
+            self._graph_for(length)
+
+    def forward(self, input_ids, attention_mask):
+        length = input_ids.shape[1]
+        bucket = next((size for size in TRACE_LENGTH_BUCKETS if size >= length), TRACE_LENGTH_BUCKETS[-1])
+        if length < bucket:
+            padding = bucket - length
+            input_ids = torch.nn.functional.pad(input_ids, (0, padding), value=self.pad_token_id)
+            attention_mask = torch.nn.functional.pad(attention_mask, (0, padding), value=0)
+        outputs = self._graph_for(bucket)(input_ids[:, :bucket], attention_mask[:, :bucket])
+        return SimpleNamespace(logits=outputs)
+
+def optimize_model(model, backend, tokenizer, device):
+    """Returns an inference-only copy of model for the given backend ("fp32", "int8" or "torchscript")."""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose one of: {', '.join(INFERENCE_BACKENDS)}")
+    if backend == "fp32":
+        return model
+    if backend == "int8":
+        if device.type != "cpu":
+            raise ValueError("The int8 backend uses dynamic quantization, which only runs on CPU.")
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8)
+    scripted = copy.deepcopy(model)
+    scripted.config.torchscript = True
+    scripted.eval()
+    return TracedClassifier(scripted, tokenizer.pad_token_id)
+
+def check_parity(csv_path, backend, device, batch_size=32):
+    """
+    Scores csv_path with fp32 and backend and reports how far the backend drifts:
+    probability differences, status label agreement, accuracy and speed.
+    """
+    from model_registry import load_classifier
+    from predict import predict_scam_batch, get_status_details
+
+    df = pd.read_csv(csv_path)
+    if not {'text', 'label'}.issubset(df.columns):
+        raise ValueError("The parity CSV must contain 'text' and 'label' columns.")
+    texts = df["text"].astype(str).tolist()
+    labels = df["label"].tolist()
+
+    results = {}
+    for name in ("fp32", backend):
+        _, model, _ = load_classifier(device, backend=name)
+        started = time.perf_counter()
+        probabilities = []
+        for i in range(0, len(texts), batch_size):
+            probabilities.extend(predict_scam_batch(texts[i:i + batch_size], model, device))
+        results[name] = (probabilities, time.perf_counter() - started)
+
+    reference, reference_time = results["fp32"]
+    candidate, candidate_time = results[backend]
+    differences = [abs(a - b) for a, b in zip(reference, candidate)]
+    status_matches = sum(get_status_details(a)[0] == get_status_details(b)[0] for a, b in zip(reference, candidate))
+    return {
+        "backend": backend,
+        "rows": len(texts),
+        "max_abs_prob_diff": max(differences),
+        "mean_abs_prob_diff": sum(differences) / len(differences),
+        "status_agreement": status_matches / len(texts),
+        "fp32_accuracy": sum((p >= 0.5) == bool(l) for p, l in zip(reference, labels)) / len(texts),
+        "backend_accuracy": sum((p >= 0.5) == bool(l) for p, l in zip(candidate, labels)) / len(texts),
+        "fp32_rows_per_sec": len(texts) / reference_time,
+        "backend_rows_per_sec": len(texts) / candidate_time,
+        "speedup": reference_time / candidate_time,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an inference backend against fp32 on a held-out CSV.")
+    parser.add_argument("csv_path", help="CSV with 'text' and 'label' columns")
+    parser.add_argument("--backend", choices=INFERENCE_BACKENDS[1:], default="int8")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+    report = check_parity(args.csv_path, args.backend, torch.device("cpu"), args.batch_size)
+    for key, value in report.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,146 @@
+import os
+import random
+import threading
+import numpy as np
+import pandas as pd
+from model_registry import get_tokenizer
+
+NUM_FEATURES = 2 ** 18  # Hashed unigram + bigram buckets over token ids
+LEXICAL_MODEL_PATH = "model/lexical_filter.npz"
+_UNIGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_BIGRAM_LEFT = np.uint64(0x100000001B3)
+_BIGRAM_RIGHT = np.uint64(0xC2B2AE3D27D4EB4F)
+
+def hashed_features(ids):
+    """
+    Maps token ids to (feature_indices, values): hashed unigrams and bigrams,
+    log-scaled counts, L2-normalised. Works on the same ids the transformer
+    sees, so the live context never has to be decoded back to text.
+    """
+    ids = np.asarray(ids, dtype=np.uint64)
+    if ids.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    grams = ids * _UNIGRAM_MULTIPLIER
+    if ids.size > 1:
+        grams = np.concatenate([grams, (ids[:-1] * _BIGRAM_LEFT) ^ (ids[1:] * _BIGRAM_RIGHT)])
+    buckets = ((grams >> np.uint64(32)) % np.uint64(NUM_FEATURES)).astype(np.int64)
+    indices, counts = np.unique(buckets, return_counts=True)
+    values = np.log1p(counts).astype(np.float32)
+    values /= np.linalg.norm(values)
+    return indices, values
+
+class LexicalScorer:
+    """Logistic regression over hashed token-id n-grams; microseconds per context."""
+
+    def __init__(self, weights=None, bias=0.0):
+        self.weights = np.zeros(NUM_FEATURES, dtype=np.float32) if weights is None else weights
+        self.bias = float(bias)
+
+    def predict_proba(self, ids):
+        indices, values = hashed_features(ids)
+        logit = float(self.weights[indices] @ values) + self.bias
+        return 1.0 / (1.0 + np.exp(-logit))
+
+    @classmethod
+    def train(cls, id_lists, labels, epochs=5, learning_rate=0.5, l2=1e-6, seed=42):
+        """Fits the scorer with plain SGD on sparse hashed features."""
+        scorer = cls()
+        examples = [(hashed_features(ids), float(label)) for ids, label in zip(id_lists, labels)]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            for (indices, values), label in examples:
+                weights = scorer.weights[indices]
+                logit = float(weights @ values) + scorer.bias
+                gradient = 1.0 / (1.0 + np.exp(-logit)) - label
+                scorer.weights[indices] = weights - learning_rate * (gradient * values + l2 * weights)
+                scorer.bias -= learning_rate * gradient
+        return scorer
+
+    def save(self, path=LEXICAL_MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, bias=np.array([self.bias]))
+
+    @classmethod
+    def load(cls, path=LEXICAL_MODEL_PATH):
+        data = np.load(path)
+        return cls(data["weights"], data["bias"][0])
+
+class ScoringCascade:
+    """
+    First stage in front of the transformer. Contexts the lexical scorer is
+    confident about (below low or above high) are answered immediately; the
+    uncertain band around the status thresholds escalates to DistilBERT.
+    A small sample of confident answers is also re-scored by the full model
+    to track how often the two stages agree on the status.
+    """
+
+    def __init__(self, scorer, low=0.1, high=0.95, shadow_rate=0.02):
+        self.scorer = scorer
+        self.low = low
+        self.high = high
+        self.shadow_rate = shadow_rate
+        self._lock = threading.Lock()
+        self.lexical_decisions = 0
+        self.escalations = 0
+        self.shadow_checks = 0
+        self.shadow_agreements = 0
+
+    def route(self, ids):
+        """Returns the lexical probability if it is confident, or None to escalate."""
+        scam_prob = self.scorer.predict_proba(ids)
+        confident = scam_prob < self.low or scam_prob > self.high
+        with self._lock:
+            if confident:
+                self.lexical_decisions += 1
+            else:
+                self.escalations += 1
+        return scam_prob if confident else None
+
+    def should_shadow(self):
+        return random.random() < self.shadow_rate
+
+    def record_shadow(self, lexical_prob, full_prob):
+        from predict import get_status_details
+        with self._lock:
+            self.shadow_checks += 1
+            self.shadow_agreements += int(get_status_details(lexical_prob)[0] == get_status_details(full_prob)[0])
+
+    def stats(self):
+        with self._lock:
+            routed = self.lexical_decisions + self.escalations
+            return {
+                "low": self.low,
+                "high": self.high,
+                "lexical_decisions": self.lexical_decisions,
+                "escalations": self.escalations,
+                "escalation_rate": self.escalations / routed if routed else 0.0,
+                "shadow_checks": self.shadow_checks,
+                "shadow_agreement_rate": self.shadow_agreements / self.shadow_checks if self.shadow_checks else None,
+            }
+
+def train_lexical_filter(csv_path="dataset.csv", output_path=LEXICAL_MODEL_PATH, eval_size=0.1):
+    """Trains the lexical scorer on the same dataset and feedback rows as train.py and saves it."""
+    from train import load_feedback_data
+
+    df = pd.read_csv(csv_path)[["text", "label"]]
+    feedback_df = load_feedback_data()
+    if feedback_df is not None and not feedback_df.empty:
+        df = pd.concat([df, feedback_df], ignore_index=True).drop_duplicates(subset=["text"])
+    df = df.sample(frac=1.0, random_state=42).reset_index(drop=True)
+    id_lists = get_tokenizer()(df["text"].astype(str).tolist(), add_special_tokens=False)["input_ids"]
+    labels = df["label"].astype(int).tolist()
+
+    split = int(len(df) * (1 - eval_size))
+    scorer = LexicalScorer.train(id_lists[:split], labels[:split])
+    eval_probs = [scorer.predict_proba(ids) for ids in id_lists[split:]]
+    if eval_probs:
+        accuracy = np.mean([(p >= 0.5) == bool(l) for p, l in zip(eval_probs, labels[split:])])
+        print(f"Lexical filter eval accuracy: {accuracy:.4f} on {len(eval_probs)} rows")
+    scorer = LexicalScorer.train(id_lists, labels)
+    scorer.save(output_path)
+    print(f"Lexical filter saved to {output_path}")
+    return scorer
+
+if __name__ == "__main__":
+    train_lexical_filter()
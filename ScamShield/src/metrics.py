@@ -0,0 +1,115 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds in seconds; tuned for stages between ~100 us (cache hits) and ~10 s (STT timeouts)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Set to a dict for the duration of a profiled request; stage timers add their durations to it
+request_profile = ContextVar("request_profile", default=None)
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram. observe() is a bisect and two
+    increments, so it is cheap enough for every request on the hot path.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+class MetricsRegistry:
+    """
+    Holds labelled histograms and gauges and renders them in the Prometheus
+    text exposition format. Gauges are callables evaluated at scrape time, so
+    they cost nothing between scrapes.
+    """
+
+    def __init__(self, prefix="scamshield"):
+        self.prefix = prefix
+        self._histograms = {}  # name -> (help, {labels: Histogram})
+        self._gauges = {}  # name -> (help, {labels: fn})
+
+    def histogram(self, name, help_text, **labels):
+        _, series = self._histograms.setdefault(name, (help_text, {}))
+        key = tuple(sorted(labels.items()))
+        if key not in series:
+            series[key] = Histogram()
+        return series[key]
+
+    def gauge(self, name, help_text, fn, **labels):
+        """Registers fn() as the value of a gauge; fn may also be a plain number."""
+        _, series = self._gauges.setdefault(name, (help_text, {}))
+        series[tuple(sorted(labels.items()))] = fn
+
+    @contextmanager
+    def time_stage(self, operation, stage):
+        """Times the block into the stage histogram and, if profiling, the current request's profile."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.histogram("stage_seconds", "Time spent in each stage of an operation.",
+                           operation=operation, stage=stage).observe(elapsed)
+            profile = request_profile.get()
+            if profile is not None:
+                profile[stage] = profile.get(stage, 0.0) + elapsed
+
+    def render(self):
+        lines = []
+        for name, (help_text, series) in self._histograms.items():
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for labels, histogram in series.items():
+                for bound, count in histogram.cumulative():
+                    bucket_labels = _format_labels(labels + (("le", _format_bound(bound)),))
+                    lines.append(f"{full_name}_bucket{bucket_labels} {count}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+        for name, (help_text, series) in self._gauges.items():
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} gauge")
+            for labels, fn in series.items():
+                try:
+                    value = fn() if callable(fn) else fn
+                except Exception as e:
+                    print(f"Error reading gauge {full_name}: {e}")
+                    continue
+                lines.append(f"{full_name}{_format_labels(labels)} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, operation):
+        """Returns {stage: {"count", "total_seconds"}} for one operation, for processes nobody scrapes."""
+        _, series = self._histograms.get("stage_seconds", (None, {}))
+        return {
+            dict(labels)["stage"]: {"count": histogram.count, "total_seconds": histogram.sum}
+            for labels, histogram in series.items()
+            if dict(labels).get("operation") == operation
+        }
+
+metrics = MetricsRegistry()
@@ -0,0 +1,69 @@
+import os
+import threading
+import torch
+from transformers import DistilBertForSequenceClassification, DistilBertTokenizerFast
+from inference_backends import optimize_model, TracedClassifier
+
+MODEL_NAME = "distilbert-base-uncased"
+CACHE_DIR = "./hf_models"
+MODEL_DIR = "model/scam_detector"
+
+# One tokenizer/model per key per process, shared by backend, Gradio UI, trainer and predictor.
+_lock = threading.RLock()
+_tokenizers = {}
+_models = {}
+_optimized = {}
+
+def get_tokenizer(name=MODEL_NAME):
+    """Returns the shared Rust-backed fast tokenizer, loading it on first use."""
+    with _lock:
+        if name not in _tokenizers:
+            _tokenizers[name] = DistilBertTokenizerFast.from_pretrained(name, cache_dir=CACHE_DIR)
+        return _tokenizers[name]
+
+def get_model(model_dir=MODEL_DIR, device=None):
+    """
+    Returns (model, model_version) for model_dir, loading it on first use.
+    Falls back to the pre-trained base model when no fine-tuned checkpoint loads.
+    """
+    with _lock:
+        if model_dir not in _models:
+            try:
+                if not os.path.exists(model_dir):
+                    raise FileNotFoundError(f"{model_dir} does not exist")
+                model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+                print("Loaded fine-tuned model from:", model_dir)
+                model_version = model_dir
+            except Exception as e:
+                print(f"Could not load fine-tuned model: {e}. Loading pre-trained model.")
+                model = DistilBertForSequenceClassification.from_pretrained(MODEL_NAME, num_labels=2, cache_dir=CACHE_DIR)
+                model_version = MODEL_NAME
+            model.eval()
+            _models[model_dir] = (model, model_version)
+        model, model_version = _models[model_dir]
+        if device is not None:
+            model.to(device)
+        return model, model_version
+
+def load_classifier(device, model_dir=MODEL_DIR, backend="fp32"):
+    """
+    Returns (tokenizer, model, model_version) ready for inference on device,
+    with the model prepared for the given inference backend.
+    """
+    tokenizer = get_tokenizer()
+    model, model_version = get_model(model_dir, device)
+    with _lock:
+        key = (model_dir, backend)
+        if key not in _optimized:
+            _optimized[key] = optimize_model(model, backend, tokenizer, device)
+        return tokenizer, _optimized[key], model_version
+
+def warm_up(device, model_dir=MODEL_DIR, backend="fp32"):
+    """Loads the classifier and runs one dummy forward pass so the first request is not cold."""
+    tokenizer, model, _ = load_classifier(device, model_dir, backend)
+    if isinstance(model, TracedClassifier):
+        model.trace_all_buckets()
+    inputs = tokenizer("warm up", return_tensors="pt")
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+    with torch.no_grad():
+        model(**inputs)
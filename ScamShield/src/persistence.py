@@ -0,0 +1,161 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from metrics import metrics
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL")
+
+def open_connection(db_path, synchronous="NORMAL"):
+    """Opens a connection in WAL mode that may be shared across threads (one user at a time)."""
+    db = sqlite3.connect(db_path, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(f"PRAGMA synchronous={synchronous}")
+    return db
+
+class ConnectionPool:
+    """A fixed set of long-lived WAL connections handed out one request at a time."""
+
+    def __init__(self, db_path, size=4, synchronous="NORMAL"):
+        self._connections = queue.Queue()
+        for _ in range(size):
+            self._connections.put(open_connection(db_path, synchronous))
+
+    @contextmanager
+    def connection(self):
+        db = self._connections.get()
+        try:
+            yield db
+        finally:
+            if db.in_transaction:
+                db.rollback()
+            self._connections.put(db)
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+class CallRecordWriter:
+    """
+    Write-behind queue for call_records. submit() only enqueues; a writer
+    thread drains up to batch_size rows (waiting at most flush_interval for
+    more) and commits them in one transaction on its own WAL connection.
+
+    Durability is traded for latency with synchronous ("OFF", "NORMAL",
+    "FULL") and flush_interval; callers that need the row on disk can wait
+    on the Future returned by submit().
+    """
+
+    INSERT_SQL = """
+        INSERT INTO call_records (
+            call_id, start_time, end_time, duration, caller_number,
+            full_transcription, user_feedback, final_status, model_version_used
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    _STOP = object()
+
+    def __init__(self, db_path, batch_size=200, flush_interval=0.05, synchronous="NORMAL", max_queue=10000):
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of: {', '.join(SYNCHRONOUS_MODES)}")
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.batches_committed = 0
+        self.last_commit_ms = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="call-record-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, record):
+        """Queues one call_records row and returns a Future that resolves once it is committed."""
+        future = Future()
+        self._queue.put_nowait((record, future))
+        return future
+
+    def flush(self):
+        """Blocks until every row submitted so far has been committed or failed."""
+        self._queue.join()
+
+    def close(self):
+        """Commits everything still queued and stops the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not self._STOP:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        db = open_connection(self.db_path, self.synchronous)
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch[-1] is self._STOP
+                items = batch[:-1] if stop else batch
+                if items:
+                    self._write(db, items)
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    break
+        finally:
+            db.close()
+
+    def _write(self, db, items):
+        started = time.perf_counter()
+        try:
+            with db:
+                db.executemany(self.INSERT_SQL, [record for record, _ in items])
+            results = [None] * len(items)
+        except sqlite3.Error:
+            # One bad row (e.g. a duplicate call_id) must not sink the rest of the group.
+            results = []
+            for record, _ in items:
+                try:
+                    with db:
+                        db.execute(self.INSERT_SQL, record)
+                    results.append(None)
+                except sqlite3.Error as e:
+                    results.append(e)
+        elapsed = time.perf_counter() - started
+        self.last_commit_ms = 1000.0 * elapsed
+        metrics.histogram("db_commit_seconds", "Time to group-commit one batch of call records.").observe(elapsed)
+        self.batches_committed += 1
+        for (_, future), error in zip(items, results):
+            if error is None:
+                self.rows_written += 1
+                future.set_result(True)
+            else:
+                self.rows_failed += 1
+                print(f"Database error writing call record: {error}")
+                future.set_exception(error)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "batches_committed": self.batches_committed,
+            "last_commit_ms": self.last_commit_ms,
+            "synchronous": self.synchronous,
+        }
@@ -1,12 +1,8 @@
 import io
 import torch
-import speech_recognition as sr
 from pydub import AudioSegment
-from transformers import DistilBertTokenizer, DistilBertForSequenceClassification
-
-MODEL_NAME = "distilbert-base-uncased"
-CACHE_DIR = "./hf_models"
-tokenizer = DistilBertTokenizer.from_pretrained(MODEL_NAME, cache_dir=CACHE_DIR)
+from model_registry import get_tokenizer
+from transcription import get_engine
 
 def get_status_details(scam_prob):
     """Determines scam status based on probability."""
@@ -38,32 +34,119 @@ def convert_audio_to_wav(input_data, file_format=None):
     wav_io.seek(0)
     return wav_io
 
-def transcribe_audio(wav_file):
-    """Transcribes WAV audio to text using Google Speech Recognition."""
-    recognizer = sr.Recognizer()
-    try:
-        with sr.AudioFile(wav_file) as source:
-            audio_data = recognizer.record(source)
-        text = recognizer.recognize_google(audio_data, language="auto")
-        print(f"Transcription successful: {text[:50]}...")
-        return text
-    except sr.UnknownValueError:
-        raise Exception("Speech Recognition could not understand audio")
-    except sr.RequestError as e:
-        raise Exception(f"Could not request results from Speech Recognition service; {e}")
+def transcribe_audio(audio, engine=None):
+    """Transcribes PcmAudio or WAV audio to text with the given engine (Google Speech Recognition by default)."""
+    engine = engine or get_engine("google")
+    text = engine.transcribe(audio)
+    print(f"Transcription successful: {text[:50]}...")
+    return text
 
-def predict_scam(text, model, device):
-    """Predicts scam probability using the DistilBERT model."""
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
+def encode_text(text):
+    """Tokenizes text to ids without special tokens, for appending to a running context."""
+    return get_tokenizer()(text, add_special_tokens=False)["input_ids"]
+
+def build_model_inputs(id_lists, max_length=512):
+    """
+    Wraps each list of context ids in [CLS] ... [SEP] and pads the batch.
+    Contexts longer than max_length keep their most recent ids.
+    """
+    tokenizer = get_tokenizer()
+    body_length = max_length - 2
+    rows = [[tokenizer.cls_token_id] + list(ids)[-body_length:] + [tokenizer.sep_token_id] for ids in id_lists]
+    width = max(len(row) for row in rows)
+    input_ids = torch.full((len(rows), width), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+    for i, row in enumerate(rows):
+        input_ids[i, :len(row)] = torch.tensor(row, dtype=torch.long)
+        attention_mask[i, :len(row)] = 1
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+def predict_scam_ids_batch(id_lists, model, device):
+    """Predicts scam probabilities for already-tokenized contexts in one padded forward pass."""
+    return _forward_scam_probabilities(build_model_inputs(id_lists), model, device)
+
+def predict_scam_batch(texts, model, device):
+    """Predicts scam probabilities for a list of texts in one padded forward pass."""
+    inputs = get_tokenizer()(list(texts), return_tensors="pt", truncation=True, padding=True, max_length=512)
+    return _forward_scam_probabilities(inputs, model, device)
+
+def _forward_scam_probabilities(inputs, model, device):
     inputs = {k: v.to(device) for k, v in inputs.items()}
     try:
         with torch.no_grad():
             outputs = model(**inputs)
         logits = outputs.logits
         probabilities = torch.nn.functional.softmax(logits, dim=-1)
-        scam_prob = probabilities[0][1].item()
-        print(f"Scam Probability: {scam_prob:.4f}")
-        return scam_prob
+        return probabilities[:, 1].tolist()
     except Exception as e:
         print(f"Model prediction error: {e}")
         raise Exception(f"Error during model prediction: {e}")
+
+def predict_scam(text, model, device):
+    """Predicts scam probability using the DistilBERT model."""
+    scam_prob = predict_scam_batch([text], model, device)[0]
+    print(f"Scam Probability: {scam_prob:.4f}")
+    return scam_prob
+
+WINDOW_POOLING_MODES = ("max", "mean", "attention")
+WINDOW_BATCH_SIZE = 16  # Max windows in one forward pass when scoring long documents
+
+def split_windows(ids, window_size=512, overlap=128):
+    """Splits context ids into overlapping windows that each fit the model with [CLS]/[SEP]."""
+    body_length = window_size - 2
+    if overlap >= body_length:
+        raise ValueError("overlap must be smaller than the window body.")
+    ids = list(ids)
+    if len(ids) <= body_length:
+        return [ids]
+    step = body_length - overlap
+    starts = list(range(0, len(ids) - body_length, step)) + [len(ids) - body_length]
+    return [ids[start:start + body_length] for start in starts]
+
+def pool_window_scores(window_probs, pooling="max"):
+    """
+    Combines per-window scam probabilities into one document score.
+    "attention" weights each window by the softmax of its scam logit, so
+    strongly scam-like windows dominate without ignoring the rest.
+    """
+    if pooling not in WINDOW_POOLING_MODES:
+        raise ValueError(f"Unknown pooling '{pooling}'. Choose one of: {', '.join(WINDOW_POOLING_MODES)}")
+    probs = torch.tensor(window_probs, dtype=torch.float64)
+    if pooling == "max":
+        return probs.max().item()
+    if pooling == "mean":
+        return probs.mean().item()
+    weights = torch.softmax(torch.logit(probs, eps=1e-6), dim=0)
+    return (weights * probs).sum().item()
+
+def score_long_ids_batch(id_lists, model, device, window_size=512, overlap=128, pooling="max",
+                         batch_size=WINDOW_BATCH_SIZE):
+    """
+    Scores several documents of any length. Their windows run in forward
+    passes of at most batch_size, so one long document cannot build an
+    unbounded batch.
+    """
+    windows = []
+    owners = []
+    for document_index, ids in enumerate(id_lists):
+        for window in split_windows(ids, window_size, overlap):
+            windows.append(window)
+            owners.append(document_index)
+    window_probs = []
+    for start in range(0, len(windows), batch_size):
+        window_probs.extend(predict_scam_ids_batch(windows[start:start + batch_size], model, device))
+    per_document = [[] for _ in id_lists]
+    for document_index, prob in zip(owners, window_probs):
+        per_document[document_index].append(prob)
+    return [pool_window_scores(probs, pooling) for probs in per_document]
+
+def score_long_texts(texts, model, device, window_size=512, overlap=128, pooling="max"):
+    """Like score_long_ids_batch, for raw text such as full call transcriptions."""
+    id_lists = get_tokenizer()(list(texts), add_special_tokens=False)["input_ids"]
+    return score_long_ids_batch(id_lists, model, device, window_size, overlap, pooling)
+
+def score_long_text(text, model, device, window_size=512, overlap=128, pooling="max"):
+    """Scores one long text instead of silently truncating it at 512 tokens."""
+    scam_prob = score_long_texts([text], model, device, window_size, overlap, pooling)[0]
+    print(f"Scam Probability: {scam_prob:.4f}")
+    return scam_prob
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+class PredictionCache:
+    """
+    Bounded LRU cache of scam probabilities keyed by a hash of the context's
+    token ids, the model version and a scope naming how the ids were scored.
+    Entries expire after ttl seconds, and a new model_version clears the
+    cache so stale scores are never served.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model_version = None
+        self._entries = OrderedDict()  # key -> (scam_prob, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(ids, model_version, scope=""):
+        digest = hashlib.blake2b(array("l", ids).tobytes(), digest_size=16)
+        digest.update(str(model_version).encode())
+        digest.update(b"\0" + scope.encode())
+        return digest.digest()
+
+    def _check_version(self, model_version):
+        if model_version != self.model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, ids, model_version, scope=""):
+        """Returns the cached probability for these ids, or None on a miss."""
+        key = self.make_key(ids, model_version, scope)
+        with self._lock:
+            self._check_version(model_version)
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, ids, model_version, scam_prob, scope=""):
+        key = self.make_key(ids, model_version, scope)
+        with self._lock:
+            self._check_version(model_version)
+            self._entries[key] = (scam_prob, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "model_version": self.model_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,210 @@
+import argparse
+import re
+from persistence import open_connection
+
+DATABASE_PATH = "scam_calls.db"
+MODEL_DIR = "model/scam_detector"
+FTS_BACKFILL_BATCH = 2000  # call_records rows indexed per backfill transaction
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS call_records (
+        call_id TEXT PRIMARY KEY,
+        start_time DATETIME,
+        end_time DATETIME,
+        duration REAL,
+        caller_number TEXT,
+        full_transcription TEXT,
+        user_feedback TEXT,
+        final_status TEXT,
+        model_version_used TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS model_metadata (
+        model_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        training_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        dataset_version TEXT,
+        accuracy REAL,
+        training_epochs INTEGER,
+        number_labels INTEGER,
+        model_dir TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingestion_state (
+        name TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL
+    )
+    """,
+]
+
+INDEXES = [
+    # call_id is the primary key, which SQLite already indexes.
+    "DROP INDEX IF EXISTS idx_call_id",
+    """
+    CREATE INDEX IF NOT EXISTS idx_call_records_feedback
+    ON call_records (user_feedback) WHERE user_feedback IS NOT NULL
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_call_records_status_time ON call_records (final_status, start_time)",
+    "CREATE INDEX IF NOT EXISTS idx_call_records_start_time ON call_records (start_time)",
+]
+
+# External-content FTS5 index: the transcript text lives only in call_records.
+FTS_TABLE = """
+    CREATE VIRTUAL TABLE call_records_fts USING fts5(
+        full_transcription, content='call_records', content_rowid='rowid'
+    )
+"""
+
+# Rows up to fts_backfill_target predate the index and are only indexed once backfill_fts() reaches them.
+INDEXED_ROW = """
+    (SELECT {rowid} > COALESCE((SELECT last_rowid FROM ingestion_state WHERE name = 'fts_backfill_target'), 0)
+         OR {rowid} <= COALESCE((SELECT last_rowid FROM ingestion_state WHERE name = 'fts_backfill'), 0))
+"""
+
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS call_records_fts_insert AFTER INSERT ON call_records BEGIN
+        INSERT INTO call_records_fts (rowid, full_transcription) VALUES (new.rowid, new.full_transcription);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS call_records_fts_delete AFTER DELETE ON call_records BEGIN
+        INSERT INTO call_records_fts (call_records_fts, rowid, full_transcription)
+        SELECT 'delete', old.rowid, old.full_transcription WHERE {INDEXED_ROW.format(rowid="old.rowid")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS call_records_fts_update AFTER UPDATE OF full_transcription ON call_records BEGIN
+        INSERT INTO call_records_fts (call_records_fts, rowid, full_transcription)
+        SELECT 'delete', old.rowid, old.full_transcription WHERE {INDEXED_ROW.format(rowid="old.rowid")};
+        INSERT INTO call_records_fts (rowid, full_transcription)
+        SELECT new.rowid, new.full_transcription WHERE {INDEXED_ROW.format(rowid="new.rowid")};
+    END
+    """,
+]
+
+def init_db(db_path=DATABASE_PATH, synchronous="NORMAL"):
+    """
+    Creates or upgrades the database schema. On a database without the
+    full-text index, the index and its sync triggers are added in one
+    transaction together with a backfill target: rows inserted from then on
+    are indexed by the triggers, older rows by backfill_fts().
+    """
+    db = open_connection(db_path, synchronous)
+    try:
+        with db:
+            for statement in TABLES + INDEXES:
+                db.execute(statement)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(model_metadata)")}
+            if "model_dir" not in columns:
+                db.execute("ALTER TABLE model_metadata ADD COLUMN model_dir TEXT")
+                # Rows from before the column were all written by train_model for MODEL_DIR.
+                db.execute(
+                    "UPDATE model_metadata SET model_dir = ? WHERE model_name NOT LIKE '%-student-%'", (MODEL_DIR,)
+                )
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            has_fts = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'call_records_fts'"
+            ).fetchone()
+            if not has_fts:
+                db.execute(FTS_TABLE)
+                target = db.execute("SELECT COALESCE(MAX(rowid), 0) FROM call_records").fetchone()[0]
+                db.executemany(
+                    "INSERT OR REPLACE INTO ingestion_state (name, last_rowid) VALUES (?, ?)",
+                    [("fts_backfill", 0), ("fts_backfill_target", target)],
+                )
+                if target:
+                    print(f"Full-text index created; {target} existing call records will be backfilled.")
+            for statement in FTS_TRIGGERS:
+                db.execute(statement)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+    finally:
+        db.close()
+
+def backfill_fts(db_path=DATABASE_PATH, batch_size=FTS_BACKFILL_BATCH, synchronous="NORMAL"):
+    """
+    Indexes the next batch of rows that predate the full-text index, in one
+    short transaction so live inserts are not held up. Returns the number of
+    rows still waiting; 0 means the backfill is complete.
+    """
+    db = open_connection(db_path, synchronous)
+    try:
+        with db:
+            state = dict(db.execute(
+                "SELECT name, last_rowid FROM ingestion_state WHERE name IN ('fts_backfill', 'fts_backfill_target')"
+            ).fetchall())
+            done, target = state.get("fts_backfill", 0), state.get("fts_backfill_target", 0)
+            if done >= target:
+                return 0
+            rows = db.execute("""
+                SELECT rowid, full_transcription FROM call_records
+                WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?
+            """, (done, target, batch_size)).fetchall()
+            db.executemany(
+                "INSERT INTO call_records_fts (rowid, full_transcription) VALUES (?, ?)",
+                [(row[0], row[1]) for row in rows],
+            )
+            done = rows[-1][0] if len(rows) == batch_size else target
+            db.execute("UPDATE ingestion_state SET last_rowid = ? WHERE name = 'fts_backfill'", (done,))
+            return db.execute(
+                "SELECT COUNT(*) FROM call_records WHERE rowid > ? AND rowid <= ?", (done, target)
+            ).fetchone()[0]
+    finally:
+        db.close()
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query matching calls that contain every
+    word, so user input can never be a syntax error. "KYC update" becomes
+    "KYC" "update".
+    """
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+SEARCH_SQL = """
+    SELECT c.call_id, c.start_time, c.caller_number, c.final_status, c.user_feedback,
+           snippet(call_records_fts, 0, '[', ']', '...', 16) AS snippet,
+           bm25(call_records_fts) AS rank
+    FROM call_records_fts
+    JOIN call_records c ON c.rowid = call_records_fts.rowid
+    WHERE call_records_fts MATCH ? {status_filter}
+    ORDER BY rank
+    LIMIT ? OFFSET ?
+"""
+
+COUNT_SQL = """
+    SELECT COUNT(*) FROM call_records_fts
+    JOIN call_records c ON c.rowid = call_records_fts.rowid
+    WHERE call_records_fts MATCH ? {status_filter}
+"""
+
+def search_calls(db, query, page=1, page_size=20, final_status=None):
+    """Returns (total, rows) for the best-ranked (bm25) calls matching an FTS5 query."""
+    params = [query]
+    status_filter = ""
+    if final_status is not None:
+        status_filter = "AND c.final_status = ?"
+        params.append(final_status)
+    total = db.execute(COUNT_SQL.format(status_filter=status_filter), params).fetchone()[0]
+    rows = db.execute(
+        SEARCH_SQL.format(status_filter=status_filter), params + [page_size, (page - 1) * page_size]
+    ).fetchall()
+    return total, rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or migrate the database and backfill the full-text index.")
+    parser.add_argument("--db", default=DATABASE_PATH)
+    parser.add_argument("--batch-size", type=int, default=FTS_BACKFILL_BATCH)
+    args = parser.parse_args()
+    init_db(args.db)
+    while True:
+        remaining = backfill_fts(args.db, args.batch_size)
+        print(f"{remaining} call records left to index.")
+        if not remaining:
+            break
@@ -0,0 +1,75 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+class StageOverloaded(Exception):
+    """Raised when a stage already has max_pending jobs admitted."""
+
+    def __init__(self, stage_name):
+        super().__init__(f"Stage '{stage_name}' is at capacity.")
+        self.stage_name = stage_name
+
+class Stage:
+    """
+    A named worker pool with admission control. Jobs beyond max_pending are
+    rejected up front instead of queueing behind everyone else, so latency
+    for admitted jobs stays bounded under load.
+    """
+
+    def __init__(self, name, max_workers, max_pending):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-stage")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @contextmanager
+    def admit(self):
+        """Reserves a slot in this stage or raises StageOverloaded."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise StageOverloaded(self.name)
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self.pending -= 1
+        self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs a blocking call on this stage's pool without blocking the event
+        loop. The slot is held until the call itself finishes, so a caller
+        that stops waiting (e.g. on a timeout) does not free capacity while
+        the worker thread is still busy.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise StageOverloaded(self.name)
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
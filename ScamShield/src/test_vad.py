@@ -0,0 +1,19 @@
+import numpy as np
+from audio_decode import PcmAudio, TARGET_SAMPLE_RATE
+from benchmark import synthetic_speech
+from vad import VoiceActivityDetector
+
+def test_short_speech_chunk_is_trimmed_without_error():
+    # 0.4 s and 0.5 s are fewer frames than the hangover kernel but enough speech to pass MIN_SPEECH_MS.
+    vad = VoiceActivityDetector()
+    for seconds in (0.4, 0.5):
+        pcm = PcmAudio(synthetic_speech(seconds), TARGET_SAMPLE_RATE)
+        trimmed = vad.trim(pcm)
+        assert trimmed is not None
+        assert len(trimmed.samples) <= len(pcm.samples)
+
+def test_sustained_tone_is_not_speech():
+    t = np.arange(2 * TARGET_SAMPLE_RATE) / TARGET_SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.3 * np.sin(2 * np.pi * 660 * t)
+    pcm = PcmAudio((tone * 32767).astype(np.int16), TARGET_SAMPLE_RATE)
+    assert VoiceActivityDetector().trim(pcm) is None
@@ -1,12 +1,19 @@
+import argparse
 import os
 import sqlite3
+import time
 import pandas as pd
 import numpy as np
-from transformers import DistilBertForSequenceClassification, Trainer, TrainingArguments, DistilBertTokenizer, get_linear_schedule_with_warmup
-from dataset_setup import load_and_prepare_dataset, tokenize_dataset
-from datasets import Dataset
+from transformers import Trainer, TrainingArguments, get_linear_schedule_with_warmup, DistilBertConfig, DistilBertForSequenceClassification
+from dataset_setup import load_and_prepare_dataset, get_data_collator
+from dataset_cache import TokenizedDatasetCache, row_hashes, rows_fingerprint
+from datasets import concatenate_datasets
 import evaluate
 import torch
+from model_registry import get_tokenizer, get_model
+from predict import build_model_inputs, encode_text
+from metrics import metrics
+from schema import init_db
 
 MODEL_NAME = "distilbert-base-uncased"
 CACHE_DIR = "./hf_models"
@@ -14,15 +21,21 @@ MODEL_DIR = "model/scam_detector"
 DATABASE_PATH = "scam_calls.db"
 DATASET_VERSION = "1.0"
 EVAL_DATASET_SIZE = 0.1  # Fraction of dataset to use for evaluation
+FEEDBACK_BATCH_SIZE = 1000  # Rows fetched per cursor batch when ingesting feedback
+STUDENT_MODEL_DIR = "model/scam_detector_student"
+STUDENT_LAYERS = 3  # The teacher has 6
+STUDENT_DIM = 384  # Hidden size; the teacher has 768
+STUDENT_HIDDEN_DIM = 1536  # Feed-forward size; the teacher has 3072
+STUDENT_HEADS = 6
+STUDENT_MAX_LENGTH = 128  # Tokens the student is trained on; serve it with a matching context length
+DISTILL_TEMPERATURE = 2.0  # Softens teacher and student logits for the distillation loss
+DISTILL_ALPHA = 0.5  # Weight of the hard-label loss; the rest goes to matching the teacher
+DISTILL_EPOCHS = 3
+LATENCY_SAMPLES = 50  # Eval chunks timed one at a time when comparing teacher and student
 
 def get_tokenizer_and_model():
-    tokenizer = DistilBertTokenizer.from_pretrained(MODEL_NAME, cache_dir=CACHE_DIR)
-    if os.path.exists(MODEL_DIR):
-        model = DistilBertForSequenceClassification.from_pretrained(MODEL_DIR)
-        print(f"Loaded fine-tuned model from {MODEL_DIR}")
-    else:
-        model = DistilBertForSequenceClassification.from_pretrained(MODEL_NAME, num_labels=2, cache_dir=CACHE_DIR)
-        print(f"Loaded pre-trained model {MODEL_NAME}")
+    tokenizer = get_tokenizer()
+    model, _ = get_model(MODEL_DIR)
     return tokenizer, model
 
 def compute_metrics(p):
@@ -30,66 +43,77 @@ def compute_metrics(p):
     predictions = np.argmax(p.predictions, axis=-1)
     return metric.compute(predictions=predictions, references=p.label_ids)
 
-def load_feedback_data(db_path=DATABASE_PATH):
+def iter_feedback_batches(db, after_rowid=0, batch_size=1000):
+    """
+    Streams labelled call_records rows newer than after_rowid as columnar
+    (rowids, texts, labels) NumPy arrays of at most batch_size rows. The
+    rowid range is a primary-key seek, so only new rows are read. Rows
+    without a transcript (e.g. calls answered from caller reputation alone)
+    get label -1, so they advance the watermark but are never trained on.
+    """
+    cursor = db.execute("""
+        SELECT rowid, full_transcription, user_feedback, final_status
+        FROM call_records
+        WHERE rowid > ? AND user_feedback IS NOT NULL
+        ORDER BY rowid
+    """, (after_rowid,))
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            rowids, texts, feedback, final_status = (np.array(column, dtype=object) for column in zip(*rows))
+            is_scam = final_status == "Scam"
+            labels = np.where(feedback == "correct", is_scam, np.where(feedback == "incorrect", ~is_scam, -1))
+            has_text = np.array([bool(text and text.strip()) for text in texts], dtype=bool)
+            labels = np.where(has_text, labels, -1)
+            yield rowids.astype(np.int64), texts, labels.astype(np.int64)
+    finally:
+        cursor.close()
+
+def load_new_feedback(db_path=DATABASE_PATH, after_rowid=0, batch_size=FEEDBACK_BATCH_SIZE):
+    """
+    Returns (feedback_df, last_rowid) for labelled rows after after_rowid.
+    feedback_df is None when there is nothing new; last_rowid is the
+    high-water mark to resume from next time.
+    """
+    last_rowid = after_rowid
+    text_batches, label_batches = [], []
     try:
         with sqlite3.connect(db_path) as db:
-            db.row_factory = sqlite3.Row
-            cursor = db.cursor()
-            cursor.execute("""
-                SELECT full_transcription as text, user_feedback, final_status
-                FROM call_records
-                WHERE user_feedback IS NOT NULL
-            """)
-            feedback_data = cursor.fetchall()
-            data = []
-            for row in feedback_data:
-                text, feedback, final_status = row["text"], row["user_feedback"], row["final_status"]
-                if feedback == "correct":
-                    label = 1 if final_status == "Scam" else 0
-                elif feedback == "incorrect":
-                    label = 0 if final_status == "Scam" else 1
-                else:
-                    continue
-                data.append({"text": text, "label": label})
-            if not data:
-                return None
-            df = pd.DataFrame(data)
-            return df
+            for rowids, texts, labels in iter_feedback_batches(db, after_rowid, batch_size):
+                last_rowid = int(rowids[-1])
+                usable = labels >= 0
+                text_batches.append(texts[usable])
+                label_batches.append(labels[usable])
     except sqlite3.Error as e:
         print(f"Database error: {e}")
-        return None
+        return None, after_rowid
     except Exception as e:
         print(f"Error loading feedback data: {e}")
-        return None
+        return None, after_rowid
+    if not text_batches or not sum(len(batch) for batch in text_batches):
+        return None, last_rowid
+    df = pd.DataFrame({"text": np.concatenate(text_batches), "label": np.concatenate(label_batches)})
+    return df, last_rowid
 
-def init_db():
-    with sqlite3.connect(DATABASE_PATH) as db:
-        cursor = db.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS call_records (
-                call_id TEXT PRIMARY KEY,
-                start_time DATETIME,
-                end_time DATETIME,
-                duration REAL,
-                caller_number TEXT,
-                full_transcription TEXT,
-                user_feedback TEXT,
-                final_status TEXT,
-                model_version_used TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS model_metadata (
-                model_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                model_name TEXT,
-                training_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                dataset_version TEXT,
-                accuracy REAL,
-                training_epochs INTEGER,
-                number_labels INTEGER
-            )
-        """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_call_id ON call_records (call_id)")
+def load_feedback_data(db_path=DATABASE_PATH):
+    """Returns every labelled feedback row as a DataFrame, or None if there are none."""
+    df, _ = load_new_feedback(db_path)
+    return df
+
+def get_feedback_watermark(name, db_path=DATABASE_PATH):
+    """Returns the last call_records rowid already ingested into the named feedback dataset."""
+    with sqlite3.connect(db_path) as db:
+        row = db.execute("SELECT last_rowid FROM ingestion_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+def set_feedback_watermark(name, last_rowid, db_path=DATABASE_PATH):
+    with sqlite3.connect(db_path) as db:
+        db.execute("""
+            INSERT INTO ingestion_state (name, last_rowid) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET last_rowid = excluded.last_rowid
+        """, (name, last_rowid))
         db.commit()
 
 def train_model(retrain=False):
@@ -101,26 +125,40 @@ def train_model(retrain=False):
         return model, tokenizer, MODEL_DIR
 
     print("Training or retraining model...")
-    init_db()
-    dataset = load_and_prepare_dataset(csv_path="dataset.csv")
-    dataset = dataset.train_test_split(test_size=EVAL_DATASET_SIZE, seed=42)
-    train_dataset = dataset["train"]
-    eval_dataset = dataset["test"]
+    init_db(DATABASE_PATH)
+    with metrics.time_stage("train_model", "load_data"):
+        dataset = load_and_prepare_dataset(csv_path="dataset.csv")
+        dataset = dataset.train_test_split(test_size=EVAL_DATASET_SIZE, seed=42)
+        train_df = dataset["train"].to_pandas()
+        eval_df = dataset["test"].to_pandas()
+    cache = TokenizedDatasetCache(tokenizer)
+    tokenized_feedback_dataset = None
 
     if retrain:
-        feedback_df = load_feedback_data()
-        if feedback_df is not None and not feedback_df.empty:
-            print(f"Loaded {len(feedback_df)} feedback records.")
-            initial_train_df = train_dataset.to_pandas()
-            combined_train_df = pd.concat([initial_train_df, feedback_df], ignore_index=True)
-            combined_train_df = combined_train_df.drop_duplicates(subset=['text'])
-            train_dataset = Dataset.from_pandas(combined_train_df)
-            print(f"Combined training dataset size: {len(train_dataset)}")
+        unique_train_df = train_df.drop_duplicates(subset=['text'])
+        # Feedback shards depend on which texts are in the training split, so key them by it.
+        feedback_name = f"feedback-{rows_fingerprint(row_hashes(unique_train_df))}"
+        # Resume after the last ingested call, unless this split's tokenized feedback is missing.
+        after_rowid = get_feedback_watermark(feedback_name) if cache.has_dataset(feedback_name) else 0
+        with metrics.time_stage("train_model", "load_feedback"):
+            feedback_df, feedback_watermark = load_new_feedback(after_rowid=after_rowid)
+        if feedback_df is not None:
+            print(f"Loaded {len(feedback_df)} new feedback records.")
+            feedback_df = feedback_df[~feedback_df['text'].isin(unique_train_df['text'])].drop_duplicates(subset=['text'])
         else:
-            print("No feedback data found or loaded.")
+            print("No new feedback data found or loaded.")
+        with metrics.time_stage("train_model", "tokenize"):
+            tokenized_feedback_dataset = cache.extend(feedback_name, feedback_df)
+        set_feedback_watermark(feedback_name, feedback_watermark)
+        if tokenized_feedback_dataset is not None:
+            train_df = unique_train_df
 
-    tokenized_train_dataset = tokenize_dataset(train_dataset)
-    tokenized_eval_dataset = tokenize_dataset(eval_dataset)
+    with metrics.time_stage("train_model", "tokenize"):
+        tokenized_train_dataset = cache.get_or_tokenize(train_df)
+        if tokenized_feedback_dataset is not None:
+            tokenized_train_dataset = concatenate_datasets([tokenized_train_dataset, tokenized_feedback_dataset])
+            print(f"Combined training dataset size: {len(tokenized_train_dataset)}")
+        tokenized_eval_dataset = cache.get_or_tokenize(eval_df)
 
     training_args = TrainingArguments(
         output_dir="./results",
@@ -134,6 +172,7 @@ def train_model(retrain=False):
         report_to="none",
         learning_rate=2e-5,
         weight_decay=0.01,
+        group_by_length=True,  # Batch similar lengths together so dynamic padding stays small
     )
 
     optimizer = torch.optim.AdamW(model.parameters(), lr=training_args.learning_rate, weight_decay=training_args.weight_decay)
@@ -150,26 +189,207 @@ def train_model(retrain=False):
         train_dataset=tokenized_train_dataset,
         eval_dataset=tokenized_eval_dataset,
         compute_metrics=compute_metrics,
+        data_collator=get_data_collator(),
         optimizers=(optimizer, scheduler)
     )
 
-    trainer.train()
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    model.save_pretrained(MODEL_DIR)
-    tokenizer.save_pretrained(MODEL_DIR)
+    with metrics.time_stage("train_model", "train"):
+        trainer.train()
+    with metrics.time_stage("train_model", "save"):
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        model.save_pretrained(MODEL_DIR)
+        tokenizer.save_pretrained(MODEL_DIR)
 
     with sqlite3.connect(DATABASE_PATH) as db:
         cursor = db.cursor()
-        eval_metrics = trainer.evaluate(eval_dataset=tokenized_eval_dataset)
+        with metrics.time_stage("train_model", "evaluate"):
+            eval_metrics = trainer.evaluate(eval_dataset=tokenized_eval_dataset)
         accuracy = eval_metrics.get("eval_accuracy")
         cursor.execute("""
-            INSERT INTO model_metadata (model_name, dataset_version, training_epochs, number_labels, accuracy)
-            VALUES (?, ?, ?, ?, ?)
-        """, (MODEL_NAME, DATASET_VERSION, training_args.num_train_epochs, 2, accuracy))
+            INSERT INTO model_metadata (model_name, dataset_version, training_epochs, number_labels, accuracy, model_dir)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (MODEL_NAME, DATASET_VERSION, training_args.num_train_epochs, 2, accuracy, MODEL_DIR))
         db.commit()
 
     print(f"Model saved to {MODEL_DIR}")
+    for stage, timing in metrics.summary("train_model").items():
+        print(f"  {stage}: {timing['total_seconds']:.2f}s over {timing['count']} call(s)")
     return model, tokenizer, MODEL_DIR
 
+class DistillationTrainer(Trainer):
+    """Trainer whose loss mixes the hard labels with the teacher's softened predictions."""
+
+    def __init__(self, *args, teacher=None, temperature=DISTILL_TEMPERATURE, alpha=DISTILL_ALPHA, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher = teacher.to(self.args.device).eval()
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        outputs = model(**inputs)
+        with torch.no_grad():
+            teacher_logits = self.teacher(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).logits
+        soft_loss = torch.nn.functional.kl_div(
+            torch.nn.functional.log_softmax(outputs.logits / self.temperature, dim=-1),
+            torch.nn.functional.softmax(teacher_logits / self.temperature, dim=-1),
+            reduction="batchmean",
+        ) * self.temperature ** 2
+        loss = self.alpha * outputs.loss + (1 - self.alpha) * soft_loss
+        return (loss, outputs) if return_outputs else loss
+
+def build_student(teacher, n_layers=STUDENT_LAYERS, dim=STUDENT_DIM, hidden_dim=STUDENT_HIDDEN_DIM, n_heads=STUDENT_HEADS):
+    """
+    Returns a smaller DistilBERT classifier initialised from the teacher.
+    Student layer i starts from an evenly spaced teacher layer wherever the
+    shapes match. With a smaller hidden size nothing matches, so the word
+    embeddings are instead projected onto their top principal components.
+    """
+    config = DistilBertConfig.from_dict({
+        **teacher.config.to_dict(), "n_layers": n_layers, "dim": dim, "hidden_dim": hidden_dim, "n_heads": n_heads,
+    })
+    student = DistilBertForSequenceClassification(config)
+    kept = np.linspace(0, teacher.config.n_layers - 1, n_layers).round().astype(int)
+    teacher_state = teacher.state_dict()
+    matched = {}
+    for key, value in student.state_dict().items():
+        source = key
+        if ".transformer.layer." in key:
+            prefix, rest = key.split(".transformer.layer.")
+            index, suffix = rest.split(".", 1)
+            source = f"{prefix}.transformer.layer.{kept[int(index)]}.{suffix}"
+        if teacher_state[source].shape == value.shape:
+            matched[key] = teacher_state[source]
+    student.load_state_dict(matched, strict=False)
+    if dim != teacher.config.dim:
+        embeddings = teacher.distilbert.embeddings.word_embeddings.weight.detach()
+        _, _, components = torch.pca_lowrank(embeddings, q=dim, center=True)
+        with torch.no_grad():
+            student.distilbert.embeddings.word_embeddings.weight.copy_((embeddings - embeddings.mean(dim=0)) @ components)
+    return student
+
+def truncate_examples(dataset, max_length):
+    """
+    Cuts tokenized examples to max_length the way build_model_inputs() does
+    at serving time: [CLS], the most recent tokens, then [SEP].
+    """
+    def truncate(example):
+        ids = example["input_ids"]
+        if len(ids) <= max_length:
+            return example
+        example["input_ids"] = ids[:1] + ids[1:-1][-(max_length - 2):] + ids[-1:]
+        example["attention_mask"] = example["attention_mask"][:max_length]
+        return example
+    return dataset.map(truncate)
+
+def evaluate_classifier(model, texts, labels, max_length, device, batch_size=32):
+    """Returns (accuracy, median per-chunk latency in ms) for model on texts truncated to max_length."""
+    model = model.to(device).eval()
+    id_lists = [encode_text(text) for text in texts]
+    predictions = []
+    with torch.no_grad():
+        for start in range(0, len(id_lists), batch_size):
+            inputs = build_model_inputs(id_lists[start:start + batch_size], max_length)
+            logits = model(**{k: v.to(device) for k, v in inputs.items()}).logits
+            predictions.extend(logits.argmax(dim=-1).tolist())
+        timings = []
+        for ids in id_lists[:LATENCY_SAMPLES]:
+            inputs = {k: v.to(device) for k, v in build_model_inputs([ids], max_length).items()}
+            started = time.perf_counter()
+            model(**inputs)
+            timings.append(time.perf_counter() - started)
+    accuracy = float(np.mean(np.array(predictions) == np.array(labels)))
+    return accuracy, 1000.0 * float(np.median(timings))
+
+def distill_model(student_dir=STUDENT_MODEL_DIR, n_layers=STUDENT_LAYERS, dim=STUDENT_DIM,
+                  hidden_dim=STUDENT_HIDDEN_DIM, n_heads=STUDENT_HEADS, max_length=STUDENT_MAX_LENGTH):
+    """
+    Distills the fine-tuned model in MODEL_DIR into a smaller student trained
+    on dataset.csv plus feedback, saves it to student_dir with its own
+    model_metadata row and prints accuracy and per-chunk latency for both.
+    """
+    if not os.path.exists(MODEL_DIR):
+        raise FileNotFoundError(f"No fine-tuned model at {MODEL_DIR}; run train.py before distilling.")
+    tokenizer = get_tokenizer()
+    teacher, teacher_version = get_model(MODEL_DIR)
+    # get_model() falls back to the untrained base model, which is no teacher.
+    if teacher_version != MODEL_DIR:
+        raise RuntimeError(f"Could not load the fine-tuned model from {MODEL_DIR}; refusing to distill the base model.")
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Distilling {MODEL_DIR} into a {n_layers}-layer, {dim}-dim student at {max_length} tokens...")
+    init_db(DATABASE_PATH)
+    dataset = load_and_prepare_dataset(csv_path="dataset.csv")
+    dataset = dataset.train_test_split(test_size=EVAL_DATASET_SIZE, seed=42)
+    train_df = dataset["train"].to_pandas()[["text", "label"]]
+    eval_df = dataset["test"].to_pandas()[["text", "label"]]
+    feedback_df = load_feedback_data()
+    if feedback_df is not None:
+        feedback_df = feedback_df[~feedback_df['text'].isin(eval_df['text'])]
+        train_df = pd.concat([train_df, feedback_df]).drop_duplicates(subset=['text'])
+        print(f"Added {len(feedback_df)} feedback records; {len(train_df)} training rows.")
+
+    cache = TokenizedDatasetCache(tokenizer)
+    tokenized_train_dataset = truncate_examples(cache.get_or_tokenize(train_df), max_length)
+    tokenized_eval_dataset = truncate_examples(cache.get_or_tokenize(eval_df), max_length)
+
+    student = build_student(teacher, n_layers, dim, hidden_dim, n_heads)
+    training_args = TrainingArguments(
+        output_dir="./results/student",
+        evaluation_strategy="epoch",
+        per_device_train_batch_size=32,
+        per_device_eval_batch_size=32,
+        num_train_epochs=DISTILL_EPOCHS,
+        save_strategy="no",
+        logging_dir="./logs",
+        logging_steps=10,
+        report_to="none",
+        learning_rate=5e-5,
+        weight_decay=0.01,
+        group_by_length=True,
+    )
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=tokenized_train_dataset,
+        eval_dataset=tokenized_eval_dataset,
+        compute_metrics=compute_metrics,
+        data_collator=get_data_collator(),
+        teacher=teacher,
+    )
+    trainer.train()
+    os.makedirs(student_dir, exist_ok=True)
+    student.save_pretrained(student_dir)
+    tokenizer.save_pretrained(student_dir)
+
+    texts, labels = eval_df["text"].astype(str).tolist(), eval_df["label"].tolist()
+    teacher_accuracy, teacher_latency = evaluate_classifier(teacher, texts, labels, 512, device)
+    student_accuracy, student_latency = evaluate_classifier(student, texts, labels, max_length, device)
+    with sqlite3.connect(DATABASE_PATH) as db:
+        db.execute("""
+            INSERT INTO model_metadata (model_name, dataset_version, training_epochs, number_labels, accuracy, model_dir)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (f"{MODEL_NAME}-student-{n_layers}l-{dim}d-{max_length}t", DATASET_VERSION, DISTILL_EPOCHS, 2,
+              student_accuracy, student_dir))
+        db.commit()
+
+    print(f"Student saved to {student_dir}")
+    print(f"  teacher: accuracy {teacher_accuracy:.4f}, {teacher_latency:.2f} ms/chunk")
+    print(f"  student: accuracy {student_accuracy:.4f}, {student_latency:.2f} ms/chunk "
+          f"({teacher_latency / student_latency:.1f}x faster)")
+    return student, tokenizer, student_dir
+
 if __name__ == "__main__":
-    train_model(retrain=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fine-tune the scam classifier or distill it into a smaller student.")
+    parser.add_argument("--retrain", action="store_true", help="Retrain even if a model exists, adding feedback data")
+    parser.add_argument("--distill", action="store_true", help="Distill the fine-tuned model into a smaller student")
+    parser.add_argument("--student-dir", default=STUDENT_MODEL_DIR)
+    parser.add_argument("--student-layers", type=int, default=STUDENT_LAYERS)
+    parser.add_argument("--student-dim", type=int, default=STUDENT_DIM)
+    parser.add_argument("--student-hidden-dim", type=int, default=STUDENT_HIDDEN_DIM)
+    parser.add_argument("--student-heads", type=int, default=STUDENT_HEADS)
+    parser.add_argument("--student-max-length", type=int, default=STUDENT_MAX_LENGTH)
+    args = parser.parse_args()
+    if args.distill:
+        distill_model(args.student_dir, args.student_layers, args.student_dim,
+                      args.student_hidden_dim, args.student_heads, args.student_max_length)
+    else:
+        train_model(retrain=args.retrain)
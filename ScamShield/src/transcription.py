@@ -0,0 +1,127 @@
+import asyncio
+import functools
+import hashlib
+import time
+import speech_recognition as sr
+from audio_decode import PcmAudio
+
+DEFAULT_TIMEOUT = 10.0  # Seconds a single transcription may take before it is abandoned
+
+class TranscriptionError(Exception):
+    """Raised when an engine cannot turn audio into text."""
+
+class NoSpeechError(TranscriptionError):
+    """Raised when the engine heard no intelligible speech in the audio."""
+
+class TranscriptionEngine:
+    """
+    Base class for speech-to-text backends. Subclasses implement recognize(),
+    which takes speech_recognition AudioData and returns text.
+    """
+
+    name = None
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio_data):
+        raise NotImplementedError
+
+    def transcribe(self, audio):
+        """Transcribes decoded PcmAudio, or a WAV file-like object, synchronously."""
+        if isinstance(audio, PcmAudio):
+            audio_data = sr.AudioData(audio.frames(), audio.sample_rate, 2)
+        else:
+            with sr.AudioFile(audio) as source:
+                audio_data = self.recognizer.record(source)
+        try:
+            return self.recognize(audio_data)
+        except sr.UnknownValueError:
+            raise NoSpeechError("Speech Recognition could not understand audio")
+        except sr.RequestError as e:
+            raise TranscriptionError(f"Could not request results from Speech Recognition service; {e}")
+
+    async def transcribe_async(self, audio, executor=None, stage=None):
+        """
+        Transcribes on executor, or on a stages.Stage (which keeps its slot
+        until the worker finishes, even after a timeout), without blocking
+        the event loop, bounded by this engine's timeout.
+        """
+        if stage is not None:
+            job = stage.run(self.transcribe, audio)
+        else:
+            job = asyncio.get_running_loop().run_in_executor(executor, self.transcribe, audio)
+        try:
+            return await asyncio.wait_for(job, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise TranscriptionError(f"Transcription with '{self.name}' timed out after {self.timeout}s")
+
+    async def transcribe_batch(self, audios, executor=None, stage=None):
+        """Transcribes several inputs concurrently. Failed items come back as TranscriptionError instances."""
+        return await asyncio.gather(
+            *(self.transcribe_async(audio, executor, stage) for audio in audios),
+            return_exceptions=True,
+        )
+
+TRANSCRIPTION_ENGINES = {}
+
+def register_engine(cls):
+    """Class decorator that makes an engine selectable by its name."""
+    TRANSCRIPTION_ENGINES[cls.name] = cls
+    return cls
+
+@functools.lru_cache(maxsize=None)
+def get_engine(name, timeout=DEFAULT_TIMEOUT):
+    """Returns the shared engine instance registered under name."""
+    if name not in TRANSCRIPTION_ENGINES:
+        raise ValueError(f"Unknown transcription engine '{name}'. Choose one of: {', '.join(TRANSCRIPTION_ENGINES)}")
+    return TRANSCRIPTION_ENGINES[name](timeout=timeout)
+
+@register_engine
+class GoogleEngine(TranscriptionEngine):
+    """Google Web Speech API. Needs network access and is rate limited."""
+
+    name = "google"
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, language="auto"):
+        super().__init__(timeout)
+        self.language = language
+        self.recognizer.operation_timeout = timeout
+
+    def recognize(self, audio_data):
+        return self.recognizer.recognize_google(audio_data, language=self.language)
+
+@register_engine
+class SphinxEngine(TranscriptionEngine):
+    """CMU PocketSphinx, fully offline. Needs the pocketsphinx package installed."""
+
+    name = "sphinx"
+
+    def recognize(self, audio_data):
+        return self.recognizer.recognize_sphinx(audio_data)
+
+@register_engine
+class StubEngine(TranscriptionEngine):
+    """
+    Deterministic offline engine for benchmarks and load tests. The same audio
+    always maps to the same phrase, after an optional simulated latency.
+    """
+
+    name = "stub"
+    PHRASES = (
+        "Hello, I am calling from your bank. Please share the OTP you just received.",
+        "Hey, are we still meeting for lunch tomorrow?",
+        "Your KYC is expiring today, install AnyDesk so we can update it remotely.",
+        "I will send you the report by this evening.",
+    )
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, latency=0.0):
+        super().__init__(timeout)
+        self.latency = latency
+
+    def recognize(self, audio_data):
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.blake2b(audio_data.get_raw_data(), digest_size=8).digest()
+        return self.PHRASES[int.from_bytes(digest, "big") % len(self.PHRASES)]
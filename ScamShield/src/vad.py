@@ -0,0 +1,114 @@
+import threading
+import numpy as np
+from audio_decode import PcmAudio, TARGET_SAMPLE_RATE
+
+FRAME_MS = 30  # Analysis frame length
+ENERGY_THRESHOLD_DB = -45.0  # Frames quieter than this (dBFS) are never speech
+NOISE_MARGIN_DB = 10.0  # Frames must also be this far above the chunk's noise floor
+SPEECH_BAND_HZ = (250, 3400)  # Speech formants; excludes mains hum and its low harmonics
+MIN_BAND_RATIO = 0.5  # Share of frame energy that must fall in the speech band
+STEADY_SIMILARITY = 0.95  # Cosine similarity of consecutive in-band spectra above which a frame counts as unchanged
+MAX_STEADY_MS = 300  # Longer runs of unchanged spectra are sustained tones (hold music, beeps), not speech
+HANGOVER_FRAMES = 8  # Frames kept either side of detected speech so word edges are not clipped
+MIN_SPEECH_MS = 240  # Chunks with less detected speech than this are treated as silent
+
+class VoiceActivityDetector:
+    """
+    Lightweight energy-based voice activity detection on decoded PCM. A frame
+    counts as speech when it is loud in absolute terms, clearly above the
+    chunk's noise floor, and carries most of its energy in the telephone
+    speech band, which rejects hum, hiss and much of the bass in hold music.
+    Frames whose spectrum stays the same for longer than a syllable are
+    dropped too, which rejects sustained in-band tones and held notes. All
+    frames of a chunk are analysed together with NumPy.
+    """
+
+    def __init__(self, frame_ms=FRAME_MS, energy_threshold_db=ENERGY_THRESHOLD_DB, noise_margin_db=NOISE_MARGIN_DB,
+                 min_band_ratio=MIN_BAND_RATIO, hangover_frames=HANGOVER_FRAMES, min_speech_ms=MIN_SPEECH_MS,
+                 steady_similarity=STEADY_SIMILARITY, max_steady_ms=MAX_STEADY_MS, sample_rate=TARGET_SAMPLE_RATE):
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.energy_threshold_db = energy_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.min_band_ratio = min_band_ratio
+        self.hangover_frames = hangover_frames
+        self.min_speech_frames = max(1, int(np.ceil(min_speech_ms / frame_ms)))
+        self.steady_similarity = steady_similarity
+        self.max_steady_frames = max(2, int(np.ceil(max_steady_ms / frame_ms)))
+        frequencies = np.fft.rfftfreq(self.frame_length, 1.0 / sample_rate)
+        self._band = (frequencies >= SPEECH_BAND_HZ[0]) & (frequencies <= SPEECH_BAND_HZ[1])
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        self._lock = threading.Lock()
+        self.chunks_seen = 0
+        self.chunks_skipped = 0
+        self.seconds_in = 0.0
+        self.seconds_kept = 0.0
+
+    def speech_frames(self, samples):
+        """Returns one boolean per whole frame of samples: True where speech was detected."""
+        n_frames = len(samples) // self.frame_length
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+        frames = samples[:n_frames * self.frame_length].reshape(n_frames, self.frame_length).astype(np.float32) / 32768.0
+        rms_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        noise_floor_db = np.percentile(rms_db, 10)
+        spectrum = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        band_ratio = spectrum[:, self._band].sum(axis=1) / (spectrum.sum(axis=1) + 1e-10)
+        loud = (rms_db > self.energy_threshold_db) & (rms_db > noise_floor_db + self.noise_margin_db)
+        # A chunk that is uniformly loud has no quiet frames to set the floor, so judge it on level alone.
+        if rms_db.max() - noise_floor_db < self.noise_margin_db:
+            loud = rms_db > self.energy_threshold_db
+        return loud & (band_ratio >= self.min_band_ratio) & ~self._sustained(spectrum[:, self._band])
+
+    def _sustained(self, band_spectrum):
+        """Marks frames inside runs of at least max_steady_frames whose in-band spectrum barely changes."""
+        magnitude = np.sqrt(band_spectrum)
+        magnitude /= np.linalg.norm(magnitude, axis=1, keepdims=True) + 1e-10
+        # unchanged[i] is True when frame i has the same spectral shape as frame i - 1.
+        unchanged = np.concatenate([[False], (magnitude[1:] * magnitude[:-1]).sum(axis=1) >= self.steady_similarity])
+        edges = np.diff(np.concatenate([[0], unchanged.astype(np.int8), [0]]))
+        sustained = np.zeros(len(unchanged), dtype=bool)
+        for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            # The run also covers the frame before its first unchanged one.
+            if end - start + 1 >= self.max_steady_frames:
+                sustained[start - 1:end] = True
+        return sustained
+
+    def trim(self, pcm):
+        """
+        Returns PcmAudio holding only the speech regions of pcm (plus
+        hangover), or None when the chunk has too little speech to transcribe.
+        """
+        is_speech = self.speech_frames(pcm.samples)
+        if is_speech.sum() >= self.min_speech_frames:
+            if self.hangover_frames:
+                kernel = np.ones(2 * self.hangover_frames + 1)
+                # mode="same" returns len(kernel) values for chunks shorter than the kernel, so slice "full".
+                dilated = np.convolve(is_speech, kernel, mode="full")
+                is_speech = dilated[self.hangover_frames:self.hangover_frames + len(is_speech)] > 0
+            keep = np.repeat(is_speech, self.frame_length)
+            samples = pcm.samples[:len(keep)][keep]
+            # Keep the partial frame at the end if the speech runs into it.
+            if len(is_speech) and is_speech[-1]:
+                samples = np.concatenate([samples, pcm.samples[len(keep):]])
+            trimmed = PcmAudio(samples, pcm.sample_rate)
+        else:
+            trimmed = None
+        with self._lock:
+            self.chunks_seen += 1
+            self.seconds_in += pcm.duration
+            if trimmed is None:
+                self.chunks_skipped += 1
+            else:
+                self.seconds_kept += trimmed.duration
+        return trimmed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chunks_seen": self.chunks_seen,
+                "chunks_skipped": self.chunks_skipped,
+                "skip_ratio": self.chunks_skipped / self.chunks_seen if self.chunks_seen else 0.0,
+                "audio_seconds_in": self.seconds_in,
+                "audio_seconds_kept": self.seconds_kept,
+                "trimmed_ratio": 1.0 - self.seconds_kept / self.seconds_in if self.seconds_in else 0.0,
+            }